@@ -0,0 +1,275 @@
+"""Benchmark do dashboard com dados sintéticos e um Supabase falso em memória.
+
+Mede tempo e pico de memória (tracemalloc) de cada etapa — carga, montagem do calendário,
+métricas e estatísticas — para catálogos de 100, 10 mil e 100 mil produtos, sem rede.
+
+Uso (a partir da raiz do repositório):
+
+    python benchmarks/bench_dashboard.py
+    python benchmarks/bench_dashboard.py --sizes 100,10000 --latency-ms 20 --json bench.json
+"""
+import argparse
+import bisect
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Antes do import: sem diretório compartilhado nem Realtime.
+os.environ["DASHBOARD_SHARED_DIR"] = ""
+os.environ["DASHBOARD_REALTIME"] = "0"
+
+import run_dashboard as rd  # noqa: E402
+
+PAISES = [
+    "Brasil", "EUA", "Argentina", "Turquia", "China", "Índia", "México", "Chile", "Peru", "Espanha",
+    "Itália", "França", "Egito", "África do Sul", "Austrália", "Nova Zelândia", "Vietnã", "Indonésia",
+    "Colômbia", "Equador", "Marrocos", "Grécia", "Portugal", "Canadá", "Uruguai", "Paraguai",
+]
+SENTIMENTOS = ["POSITIVO", "NEUTRO", "NEGATIVO"]
+PALAVRAS = (
+    "safra colheita clima chuva seca geada produção exportação preço demanda oferta estoque "
+    "área plantada produtividade qualidade mercado câmbio frete logística previsão"
+).split()
+DEFAULT_SIZES = (100, 10_000, 100_000)
+
+
+# -----------------------------------------------------------------------------
+# Dados sintéticos
+# -----------------------------------------------------------------------------
+def synthetic_rows(n: int, seed: int = 42) -> Dict[str, List[Dict[str, Any]]]:
+    """Rows of vw_monitored_products and vw_dashboard_products for ``n`` monitored products.
+
+    About 80% of the products have an analysis; 2% carry an empty or malformed COLHEITA and
+    1% a RESULTADO that fails validation, as seen in production.
+    """
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    meses = rd.MESES
+    calendario, analises = [], []
+    for i in range(1, n + 1):
+        produto = f"PRODUTO {i:06d}"
+        local = rng.choice(PAISES)
+        atualizado = (base + timedelta(minutes=i)).isoformat()
+        sorteio = rng.random()
+        if sorteio < 0.01:
+            colheita = ""
+        elif sorteio < 0.02:
+            colheita = "INDEFINIDO"
+        else:
+            colheita = f"{rng.choice(meses)}-{rng.choice(meses)}"
+        calendario.append({"ID": i, "PRODUTO": produto, "LOCAL": local, "COLHEITA": colheita, "DATA_ATUALIZACAO": atualizado})
+
+        if rng.random() >= 0.8:
+            continue
+        if rng.random() < 0.01:
+            resultado = json.dumps({"produto": produto, "links": "não é uma lista"})
+        else:
+            resultado = json.dumps(
+                {
+                    "produto": produto,
+                    "pais": local,
+                    "sentimento": rng.choice(SENTIMENTOS),
+                    "resumo": " ".join(rng.choices(PALAVRAS, k=rng.randint(40, 90))).capitalize() + ".",
+                    "links": [
+                        {
+                            "titulo": " ".join(rng.choices(PALAVRAS, k=6)).title(),
+                            "url": f"https://noticias.example.com/{i}/{j}",
+                            "data": (base + timedelta(days=rng.randint(0, 300))).date().isoformat(),
+                        }
+                        for j in range(rng.randint(0, 5))
+                    ],
+                },
+                ensure_ascii=False,
+            )
+        analises.append({"ID": i, "PRODUTO": produto, "RESULTADO": resultado, "DATA_ATUALIZACAO": atualizado})
+    return {rd.CALENDAR_VIEW: calendario, rd.DASHBOARD_VIEW: analises}
+
+
+# -----------------------------------------------------------------------------
+# Supabase falso
+# -----------------------------------------------------------------------------
+class FakeQuery:
+    """The subset of the PostgREST query builder used by the dashboard, over in-memory rows."""
+
+    def __init__(self, backend: "FakeSupabase", table: str) -> None:
+        self.backend = backend
+        self.rows = backend.tables[table]
+        self.keys = backend.keys[table]
+        self.columns: Optional[List[str]] = None
+        self.count: Optional[str] = None
+        self.filters: List[Callable[[Dict[str, Any]], bool]] = []
+        self.after_key: Any = None
+        self.order_by: Optional[Tuple[str, bool]] = None
+        self.bounds: Tuple[int, Optional[int]] = (0, None)
+
+    def select(self, columns: str, count: Optional[str] = None) -> "FakeQuery":
+        self.columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        self.count = count
+        return self
+
+    def order(self, column: str, desc: bool = False, nullsfirst: bool = False) -> "FakeQuery":
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, n: int) -> "FakeQuery":
+        self.bounds = (self.bounds[0], self.bounds[0] + n)
+        return self
+
+    def range(self, start: int, end: int) -> "FakeQuery":
+        self.bounds = (start, end + 1)
+        return self
+
+    def gt(self, column: str, value: Any) -> "FakeQuery":
+        if column == rd.VIEW_KEY_COLUMN:
+            self.after_key = value
+        else:
+            self.filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def gte(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append(lambda row: row.get(column) is not None and row[column] >= value)
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column: str, values: List[Any]) -> "FakeQuery":
+        wanted = set(values)
+        self.filters.append(lambda row: row.get(column) in wanted)
+        return self
+
+    def execute(self) -> SimpleNamespace:
+        self.backend.requests += 1
+        if self.backend.latency:
+            time.sleep(self.backend.latency)
+        # As linhas ficam ordenadas por ID: o keyset (gt em ID) é uma busca binária.
+        start = bisect.bisect_right(self.keys, self.after_key) if self.after_key is not None else 0
+        rows = self.rows[start:]
+        if self.filters:
+            rows = [row for row in rows if all(f(row) for f in self.filters)]
+        total = len(rows)
+        if self.order_by and self.order_by[0] != rd.VIEW_KEY_COLUMN:
+            column, desc = self.order_by
+            present = [row for row in rows if row.get(column) is not None]
+            rows = sorted(present, key=lambda row: row[column], reverse=desc) + [row for row in rows if row.get(column) is None]
+        lo, hi = self.bounds
+        rows = rows[lo:hi]
+        if self.columns is not None:
+            rows = [{c: row.get(c) for c in self.columns} for row in rows]
+        return SimpleNamespace(data=rows, count=total if self.count else None)
+
+
+class FakeSupabase:
+    """In-memory stand-in for the Supabase client: ``table(name)`` returns a FakeQuery."""
+
+    def __init__(self, tables: Dict[str, List[Dict[str, Any]]], latency_ms: float = 0.0) -> None:
+        self.tables = {name: sorted(rows, key=lambda r: r[rd.VIEW_KEY_COLUMN]) for name, rows in tables.items()}
+        self.keys = {name: [r[rd.VIEW_KEY_COLUMN] for r in rows] for name, rows in self.tables.items()}
+        self.latency = latency_ms / 1000
+        self.requests = 0
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+
+# -----------------------------------------------------------------------------
+# Medição
+# -----------------------------------------------------------------------------
+def measure(name: str, fn: Callable[[], Any], results: List[Dict[str, Any]], size: int, backend: FakeSupabase) -> Any:
+    """Run ``fn`` once, appending its wall time, traced peak memory and request count."""
+    requests_before = backend.requests
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    value = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    results.append(
+        {
+            "produtos": size,
+            "etapa": name,
+            "segundos": round(elapsed, 4),
+            "pico_mb": round((peak - base) / 2**20, 2),
+            "requisicoes": backend.requests - requests_before,
+        }
+    )
+    return value
+
+
+def clear_caches() -> None:
+    """Drop the process-wide store and rendered-fragment caches between runs."""
+    rd.get_dataset_store.clear()
+    rd.get_html_cache()[0].clear()
+    rd.get_chart_cache()[0].clear()
+
+
+def run_size(size: int, latency_ms: float, seed: int) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    tables = synthetic_rows(size, seed)
+    backend = FakeSupabase(tables, latency_ms)
+    rd.get_reader_client = lambda: backend
+    # Snapshot novo por tamanho: a carga inicial não pode cair no warm start do tamanho anterior.
+    rd.SNAPSHOT_DIR = tempfile.mkdtemp(prefix="bench_snapshot_")
+    clear_caches()
+
+    cal, ana = measure("load_data (carga inicial)", rd.load_data, results, size, backend)
+    store = rd.get_dataset_store()
+    store.probed_at = 0.0
+    # Com dados carregados, load_data só dispara a sonda em segundo plano: mede-se o sync em si.
+    measure("sync (sonda, sem mudança)", store.sync, results, size, backend)
+    measure("load_data (refresh incremental)", lambda: rd.load_data(refresh=True), results, size, backend)
+
+    vm = ana["view_model"]
+    measure("build_view_model", lambda: rd.build_view_model(cal, ana), results, size, backend)
+    measure("build_calendar_html", lambda: rd.build_calendar_html(cal["produtos"], cal["por_mes"]), results, size, backend)
+    measure("render_calendar_list", lambda: rd.render_calendar_list(vm), results, size, backend)
+    measure("render_metrics", lambda: rd.render_metrics(vm), results, size, backend)
+    measure("render_stats", lambda: rd.render_stats(ana["tabela"], (vm.versao,)), results, size, backend)
+    measure("render_stats (cache)", lambda: rd.render_stats(ana["tabela"], (vm.versao,)), results, size, backend)
+
+    # Reinício do processo: o snapshot em disco é servido antes de qualquer requisição.
+    clear_caches()
+    measure("warm_start (snapshot)", lambda: rd.get_dataset_store().warm_start(), results, size, backend)
+    measure("índice de busca (segundo plano)", lambda: rd.get_dataset_store().analysis_data["indice_busca"].result(), results, size, backend)
+    return results
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    print(f"{'produtos':>9}  {'etapa':<36} {'segundos':>9} {'pico MB':>9} {'req':>6}")
+    for r in results:
+        print(f"{r['produtos']:>9}  {r['etapa']:<36} {r['segundos']:>9.4f} {r['pico_mb']:>9.2f} {r['requisicoes']:>6}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="tamanhos do catálogo, separados por vírgula")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latência simulada por requisição ao Supabase")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="grava os resultados neste arquivo, para comparar entre versões")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    results: List[Dict[str, Any]] = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        results.extend(run_size(size, args.latency_ms, args.seed))
+    tracemalloc.stop()
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"gerado_em": datetime.now().isoformat(), "latencia_ms": args.latency_ms, "resultados": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,41 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
 import html
 import json
+import logging
 import os
-from collections import defaultdict
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Sequence
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field, replace
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Any
 
 import boto3
+import jwt
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc
+import pyarrow.parquet as pq
 from plotly.graph_objects import Figure
+from pympler import asizeof
+from pydantic import Json, TypeAdapter, ValidationError, field_validator
+from pydantic.dataclasses import dataclass as pydantic_dataclass
 import streamlit as st
 import streamlit.components.v1 as components
+from cachetools import LRUCache, TLRUCache
 from dotenv import load_dotenv
 from supabase import create_client, Client
 st.set_page_config(
@@ -19,463 +44,131 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="collapsed",
 )
-# Estilos globais - tema claro forçado
-CSS = """
-<style>
-  :root,
-  html,
-  body {
-    color-scheme: light !important;
-    background: linear-gradient(180deg, #f4f7fb 0%, #eef2f7 100%) !important;
-    background-color: #f4f7fb !important;
-    color: #0f172a !important;
-  }
-  
-  * {
-    color-scheme: light !important;
-  }
-  
-  html, body, .stApp {
-    background: linear-gradient(180deg, #f4f7fb 0%, #eef2f7 100%) !important;
-    background-color: #ffffff !important;
-  }
-  
-  .stApp > header,
-  .stApp > div,
-  main,
-  .block-container,
-  [data-testid="stAppViewContainer"],
-  [data-testid="stHeader"],
-  [data-testid="stAppViewContainer"] > div,
-  [data-testid="stHeader"] > div {
-    background-color: #ffffff !important;
-    background: #ffffff !important;
-    color: #ffffff !important;
-  }
-  
-  .stApp { 
-    background: linear-gradient(180deg, #f4f7fb 0%, #eef2f7 100%) !important; 
-  }
-  
-  /* Botões secundários da navbar */
-  div[data-testid="column"] .stButton>button[kind="secondary"],
-  .stButton>button[kind="secondary"],
-  button[kind="secondary"] {
-    min-height: 50px !important;
-    height: 50px !important;
-    max-height: 50px !important;
-    display: flex !important;
-    align-items: center !important;
-    justify-content: center !important;
-    font-size: 13px !important;
-    font-weight: 600 !important;
-    white-space: nowrap !important;
-    overflow: hidden !important;
-    text-overflow: ellipsis !important;
-    line-height: 1.2 !important;
-    padding: 10px 8px !important;
-    box-sizing: border-box !important;
-    background: linear-gradient(135deg, #f1f5f9, #e2e8f0) !important;
-    color: #0f172a !important;
-    border: 1px solid #cbd5e1 !important;
-  }
-  div[data-testid="column"] .stButton>button[kind="secondary"]:hover,
-  .stButton>button[kind="secondary"]:hover,
-  button[kind="secondary"]:hover {
-    background: linear-gradient(135deg, #e2e8f0, #cbd5e1) !important;
-  }
-  
-  /* TODOS os botões - força cores claras */
-  .stButton>button,
-  button[data-baseweb="button"],
-  button[kind="primary"],
-  button[kind="secondary"],
-  button[kind="tertiary"],
-  button {
-    background-color: #ffffff !important;
-    background: linear-gradient(135deg, #f1f5f9, #e2e8f0) !important;
-    color: #0f172a !important;
-    border: 1px solid #cbd5e1 !important;
-  }
-  
-  .stButton>button:hover,
-  button[data-baseweb="button"]:hover,
-  button[kind="primary"]:hover,
-  button[kind="secondary"]:hover,
-  button[kind="tertiary"]:hover,
-  button:hover {
-    background: linear-gradient(135deg, #e2e8f0, #cbd5e1) !important;
-    color: #0f172a !important;
-  }
-  
-  /* Botões primary mantêm cor primária mas com fundo claro */
-  .stButton>button[kind="primary"],
-  button[kind="primary"] {
-    background: linear-gradient(135deg, #3b82f6, #2563eb) !important;
-    color: #ffffff !important;
-    border: 1px solid #1e40af !important;
-  }
-  
-  .stButton>button[kind="primary"]:hover,
-  button[kind="primary"]:hover {
-    background: linear-gradient(135deg, #2563eb, #1d4ed8) !important;
-  }
-  
-  
-  .stMultiSelect div[data-baseweb="select"],
-  .stSelectbox div[data-baseweb="select"],
-  .stTextInput div[data-baseweb="input"],
-  .stNumberInput div[data-baseweb="input"],
-  .stDateInput div[data-baseweb="input"],
-  .stTextArea div[data-baseweb="input"] {
-    background-color: #ffffff !important;
-    color: #0f172a !important;
-    border: 1.5px solid #cbd5e1 !important;
-    border-radius: 8px !important;
-    box-shadow: 0 1px 3px rgba(0, 0, 0, 0.05) !important;
-    transition: all 0.2s ease !important;
-  }
-  
-  .stMultiSelect div[data-baseweb="select"]:focus-within,
-  .stSelectbox div[data-baseweb="select"]:focus-within,
-  .stTextInput div[data-baseweb="input"]:focus-within,
-  .stNumberInput div[data-baseweb="input"]:focus-within,
-  .stDateInput div[data-baseweb="input"]:focus-within,
-  .stTextArea div[data-baseweb="input"]:focus-within {
-    border-color: #3b82f6 !important;
-    box-shadow: 0 0 0 3px rgba(59, 130, 246, 0.1), 0 2px 4px rgba(0, 0, 0, 0.08) !important;
-  }
-  
-  .stMultiSelect input,
-  .stSelectbox input,
-  .stTextInput input,
-  .stNumberInput input,
-  .stDateInput input,
-  .stTextArea textarea {
-    background-color: #ffffff !important;
-    color: #0f172a !important;
-  }
-  
-  .stMultiSelect div[data-baseweb="select"] svg,
-  .stSelectbox div[data-baseweb="select"] svg {
-    fill: #0f172a !important;
-  }
-
-  .stSelectbox div[data-baseweb="select"] button,
-  .stMultiSelect div[data-baseweb="select"] button,
-  [data-baseweb="select"] button,
-  .stSelectbox div[data-baseweb="select"] button:focus,
-  .stMultiSelect div[data-baseweb="select"] button:focus {
-    background: linear-gradient(135deg, #f1f5f9, #e2e8f0) !important;
-    color: #0f172a !important;
-    border: 1px solid #cbd5e1 !important;
-  }
-
-  .streamlit-expanderHeader button:focus,
-  .streamlit-expanderHeader button {
-    background: linear-gradient(135deg, #e8f5e9, #ffffff) !important;
-    color: #ffffff !important;
-  }
-  
-  /* Força cores claras em dropdowns e menus de filtros */
-  [data-baseweb="popover"],
-  [data-baseweb="menu"],
-  [role="listbox"],
-  [role="option"],
-  .stSelectbox [data-baseweb="popover"],
-  .stMultiSelect [data-baseweb="popover"] {
-    background-color: #ffffff !important;
-    color: #0f172a !important;
-    border: 1px solid #cbd5e1 !important;
-  }
-  
-  [data-baseweb="popover"] [role="option"],
-  [data-baseweb="menu"] [role="option"],
-  [role="listbox"] [role="option"] {
-    background-color: #ffffff !important;
-    color: #0f172a !important;
-  }
-  
-  [data-baseweb="popover"] [role="option"]:hover,
-  [data-baseweb="menu"] [role="option"]:hover,
-  [role="listbox"] [role="option"]:hover {
-    background-color: #f1f5f9 !important;
-    color: #0f172a !important;
-  }
-  
-  /* Força cores claras em expanders e seus conteúdos */
-  .streamlit-expanderHeader {
-    background: linear-gradient(135deg, #e8f5e9, #e3f2fd) !important;
-    color: #0f172a !important;
-  }
-  
-  .streamlit-expanderContent {
-    background: #ffffff !important;
-    color: #0f172a !important;
-  }
-  
-  /* Força cores claras em todos os elementos dentro de expanders */
-  .streamlit-expanderContent * {
-    color: #0f172a !important;
-  }
-  
-  .streamlit-expanderContent p,
-  .streamlit-expanderContent div,
-  .streamlit-expanderContent span,
-  .streamlit-expanderContent markdown {
-    color: #0f172a !important;
-  }
-  
-  .js-plotly-plot,
-  .plotly,
-  .plot-container,
-  [data-testid="stPlotlyChart"] {
-    background-color: #ffffff !important;
-  }
-  
-  .plotly .modebar {
-    background-color: #ffffff !important;
-  }
-  
-  [data-baseweb] {
-    color-scheme: light !important;
-  }
-  
-  .element-container,
-  .stContainer,
-  [data-testid="stVerticalBlock"] {
-    background-color: transparent !important;
-    position: relative !important;
-    z-index: 1 !important;
-  }
-  
-  /* Garante que containers não sobreponham conteúdo */
-  .stContainer > *,
-  [data-testid="stVerticalBlock"] > * {
-    position: relative !important;
-    z-index: 2 !important;
-  }
-  
-  /* Força tema claro em todos os elementos genéricos */
-  div,
-  span,
-  p,
-  h1, h2, h3, h4, h5, h6,
-  section,
-  article,
-  aside,
-  header,
-  footer,
-  nav,
-  ul, ol, li,
-  table, tr, td, th,
-  label,
-  caption {
-    background-color: transparent !important;
-    color: #0f172a !important;
-  }
-  
-  /* Força fundo claro em containers e cards */
-  [class*="container"],
-  [class*="card"],
-  [class*="box"],
-  [class*="panel"],
-  [class*="section"] {
-    background-color: #ffffff !important;
-    background: #ffffff !important;
-    color: #0f172a !important;
-  }
-  
-  /* Força tema claro em todos os elementos genéricos */
-  div,
-  span,
-  p,
-  h1, h2, h3, h4, h5, h6,
-  section,
-  article,
-  aside,
-  header,
-  footer,
-  nav,
-  ul, ol, li,
-  table, tr, td, th,
-  label,
-  caption {
-    background-color: transparent !important;
-    color: #0f172a !important;
-  }
-  
-  /* Força fundo claro em containers e cards */
-  [class*="container"],
-  [class*="card"],
-  [class*="box"],
-  [class*="panel"],
-  [class*="section"] {
-    background-color: #ffffff !important;
-    background: #ffffff !important;
-    color: #0f172a !important;
-  }
-  
-  /* Força cores em elementos de texto */
-  p, span, div, label, caption, td, th {
-    color: #0f172a !important;
-  }
-  
-  /* Força fundo branco em elementos de formulário */
-  form,
-  fieldset,
-  legend {
-    background-color: transparent !important;
-    color: #0f172a !important;
-  }
-  
-  /* Remove qualquer herança de tema escuro */
-  [data-theme="dark"],
-  [class*="dark"],
-  [class*="Dark"] {
-    background-color: #ffffff !important;
-    background: #ffffff !important;
-    color: #0f172a !important;
-  }
-  
-  /* Força cores em elementos do Streamlit que podem herdar do sistema */
-  [data-testid],
-  [data-baseweb],
-  [role] {
-    color-scheme: light !important;
-  }
-  
-  /* Garante que todos os elementos dentro do app tenham fundo claro */
-  .stApp * {
-    color-scheme: light !important;
-  }
-  
-  /* Força cores em elementos de lista e tabela */
-  ul, ol {
-    background-color: transparent !important;
-    color: #0f172a !important;
-  }
-  
-  li {
-    background-color: transparent !important;
-    color: #0f172a !important;
-  }
-  
-  table {
-    background-color: #ffffff !important;
-    color: #0f172a !important;
-  }
-  
-  td, th {
-    background-color: #ffffff !important;
-    color: #0f172a !important;
-  }
-  
-  /* Força cores em elementos de markdown */
-  .stMarkdown,
-  .stMarkdown *,
-  [data-testid="stMarkdownContainer"],
-  [data-testid="stMarkdownContainer"] * {
-    background-color: transparent !important;
-    color: #0f172a !important;
-  }
-  
-  /* Força cores em elementos de dataframe */
-  [data-testid="stDataFrame"],
-  [data-testid="stDataFrame"] * {
-    background-color: #ffffff !important;
-    color: #0f172a !important;
-  }
-  
-  /* Força cores em elementos de info/warning/error */
-  .stInfo,
-  .stWarning,
-  .stError,
-  .stSuccess {
-    background-color: #ffffff !important;
-    color: #0f172a !important;
-  }
-</style>
-<script>
-(function() {
-  // Força tema claro no documento
-  document.documentElement.setAttribute('data-theme', 'light');
-  document.documentElement.style.colorScheme = 'light';
-  document.body.style.colorScheme = 'light';
-  
-  // Remove classes de tema escuro
-  document.documentElement.classList.remove('dark', 'Dark');
-  document.body.classList.remove('dark', 'Dark');
-  
-  // Observa mudanças no DOM para aplicar tema claro em elementos novos
-  const observer = new MutationObserver(function(mutations) {
-    mutations.forEach(function(mutation) {
-      mutation.addedNodes.forEach(function(node) {
-        if (node.nodeType === 1) { // Element node
-          // Remove classes de tema escuro
-          if (node.classList) {
-            node.classList.remove('dark', 'Dark');
-          }
-          // Força tema claro
-          node.setAttribute('data-theme', 'light');
-          node.style.colorScheme = 'light';
-          
-          // Aplica em todos os filhos
-          const allChildren = node.querySelectorAll('*');
-          allChildren.forEach(function(child) {
-            if (child.classList) {
-              child.classList.remove('dark', 'Dark');
-            }
-            child.setAttribute('data-theme', 'light');
-            child.style.colorScheme = 'light';
-          });
-        }
-      });
-    });
-  });
-  
-  // Inicia observação
-  observer.observe(document.body, {
-    childList: true,
-    subtree: true
-  });
-  
-  // Aplica tema claro em todos os elementos existentes
-  function applyLightTheme() {
-    const allElements = document.querySelectorAll('*');
-    allElements.forEach(function(el) {
-      if (el.classList) {
-        el.classList.remove('dark', 'Dark');
-      }
-      el.setAttribute('data-theme', 'light');
-      el.style.colorScheme = 'light';
-    });
-  }
-  
-  // Aplica imediatamente
-  applyLightTheme();
-  
-  // Aplica após carregamento completo
-  if (document.readyState === 'loading') {
-    document.addEventListener('DOMContentLoaded', applyLightTheme);
-  } else {
-    applyLightTheme();
-  }
-  
-  // Aplica periodicamente para garantir (fallback)
-  setInterval(applyLightTheme, 1000);
-})();
-</script>
-"""
+# Estilos globais - tema claro forçado. As cores base vêm de [theme] em .streamlit/config.toml;
+# o restante fica em static/theme.css, lido uma vez e injetado como <style>: o servidor estático
+# do Streamlit entrega .css como text/plain com nosniff, e o navegador recusaria um <link>.
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "theme.css"), encoding="utf-8") as _css:
+    THEME_STYLESHEET = f"<style>{_css.read()}</style>"
 
 # -----------------------------------------------------------------------------
 # Configuração Supabase para inserção de produtos
 # -----------------------------------------------------------------------------
 load_dotenv()
 
+# O Streamlit só configura os loggers "streamlit.*": sem handler próprio, os INFO do app (ex.: a
+# assinatura do Realtime) cairiam no WARNING do root. DASHBOARD_LOG_LEVEL ajusta o nível.
+logger = logging.getLogger("dashboard_safra")
+perf_logger = logging.getLogger("dashboard_safra.perf")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(os.environ.get("DASHBOARD_LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+    # As linhas de desempenho saem puras (uma linha JSON cada), para serem coletadas como estão.
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    perf_logger.addHandler(_handler)
+    perf_logger.propagate = False
+
+# -----------------------------------------------------------------------------
+# Instrumentação por fase (opt-in)
+# -----------------------------------------------------------------------------
+# Com DASHBOARD_PERF=1 (ou ?perf=1 na URL) cada rerun mede suas fases, mostra o painel de
+# desempenho e emite uma linha JSON por fase em dashboard_safra.perf. Desligado, ``span``
+# só consulta uma ContextVar.
+PERF_ENABLED = os.environ.get("DASHBOARD_PERF", "0") == "1"
+# Medição pedida (pelo ambiente ou por ?perf=1) sempre emite, mesmo com DASHBOARD_LOG_LEVEL acima de INFO.
+perf_logger.setLevel(logging.INFO)
+
+@dataclass
+class PerfTrace:
+    """Spans recorded during one rerun."""
+    rerun_id: str
+    spans: List[Dict[str, Any]] = field(default_factory=list)
+
+@st.cache_resource
+def get_perf_context() -> contextvars.ContextVar:
+    """Process-wide ContextVar holding the current rerun's PerfTrace (None when disabled).
+
+    Shared through cache_resource so objects created by earlier reruns record into it too.
+    """
+    return contextvars.ContextVar("dashboard_perf_trace", default=None)
+
+PERF_TRACE = get_perf_context()
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[None]:
+    """Time the enclosed block as phase ``name`` of the current rerun's trace."""
+    trace = PERF_TRACE.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = {
+            "fase": name,
+            "ms": round((time.perf_counter() - start) * 1000, 2),
+            "thread": threading.current_thread().name,
+            **attrs,
+        }
+        trace.spans.append(record)
+        perf_logger.info(json.dumps({"rerun": trace.rerun_id, **record}, ensure_ascii=False, default=str))
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """Decorator running the whole function inside ``span(name)``."""
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if PERF_TRACE.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def submit_traced(pool: ThreadPoolExecutor, name: str, fn: Callable, *args: Any, **attrs: Any) -> Any:
+    """``pool.submit`` that records ``fn`` as a span of the submitting rerun, when tracing."""
+    if PERF_TRACE.get() is None:
+        return pool.submit(fn, *args)
+
+    def run() -> Any:
+        with span(name, **attrs):
+            return fn(*args)
+
+    return pool.submit(contextvars.copy_context().run, run)
+
+def start_perf_trace() -> None:
+    """Begin this rerun's trace if profiling was requested, or clear a previous one."""
+    enabled = PERF_ENABLED or st.query_params.get("perf") == "1"
+    PERF_TRACE.set(PerfTrace(rerun_id=uuid.uuid4().hex[:12]) if enabled else None)
+
+def render_perf_panel() -> None:
+    """Debug panel with the current rerun's phase breakdown."""
+    trace = PERF_TRACE.get()
+    if trace is None or not trace.spans:
+        return
+    spans = pd.DataFrame(trace.spans)
+    resumo = (
+        spans.groupby("fase")["ms"]
+        .agg(chamadas="count", total_ms="sum", max_ms="max")
+        .sort_values("total_ms", ascending=False)
+        .reset_index()
+    )
+    with st.expander(f"Desempenho deste rerun ({trace.rerun_id})", expanded=False):
+        st.dataframe(resumo, use_container_width=True, hide_index=True)
+        st.caption("Fases aninhadas e páginas baixadas em paralelo se sobrepõem; os totais não somam o tempo do rerun.")
+        st.dataframe(spans, use_container_width=True, hide_index=True)
+
 
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.environ.get("SUPABASE_KEY")
+# Opcional: com o segredo JWT do projeto a assinatura do token também é validada localmente.
+SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
+# Segundos antes do vencimento do token a partir dos quais o GoTrue volta a ser consultado.
+AUTH_EXPIRY_MARGIN = int(os.environ.get("AUTH_EXPIRY_MARGIN", "60"))
 
 # SUPABASE_URL = st.secrets["SUPABASE_URL"]
 # SUPABASE_ANON_KEY = st.secrets["SUPABASE_KEY"]
@@ -486,18 +179,72 @@ if "sb_access_token" not in st.session_state:
 if "sb_refresh_token" not in st.session_state:
     st.session_state.sb_refresh_token = ""
 
+# Clientes: um leitor anônimo compartilhado (views do dashboard) e um cliente autenticado por
+# sessão (login e escritas). Nenhuma sessão altera o estado de auth de outra, e todos são
+# reaproveitados entre reruns, mantendo as conexões HTTP (keep-alive) abertas.
+@st.cache_resource(show_spinner=False)
+def get_reader_client() -> Optional[Client]:
+    """Anonymous client shared by every session and thread to read the dashboard views."""
+    if SUPABASE_URL and SUPABASE_ANON_KEY:
+        return create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+    return None
+
+def get_session_client() -> Optional[Client]:
+    """This session's own client for auth and writes, kept in session state across reruns."""
+    client = st.session_state.get("sb_client")
+    if client is None and SUPABASE_URL and SUPABASE_ANON_KEY:
+        client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+        st.session_state.sb_client = client
+    return client
+
 def initialize_supabase() -> None:
-    """Initialize Supabase client if not already done."""
+    """Bind the module-level ``supabase`` to this session's client."""
     global supabase
-    if supabase is None and SUPABASE_URL and SUPABASE_ANON_KEY:
-        supabase = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+    if supabase is None:
+        supabase = get_session_client()
 
-def ensure_session() -> bool:
-    """Ensure Supabase client has a valid session. Returns True if user is authenticated."""
+@traced("auth.token_claims")
+def access_token_claims(token: str) -> Optional[Dict[str, Any]]:
+    """Decode the access token locally; None if it is malformed or expired.
+
+    The signature is verified only when SUPABASE_JWT_SECRET is configured. The result
+    is memoised in the session per token, so repeated checks cost a dict lookup.
+    """
+    cached = st.session_state.get("sb_token_claims")
+    if cached and cached[0] == token:
+        claims = cached[1]
+    else:
+        try:
+            if SUPABASE_JWT_SECRET:
+                claims = jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=["HS256"], audience="authenticated")
+            else:
+                claims = jwt.decode(token, options={"verify_signature": False, "verify_exp": True})
+        except jwt.PyJWTError:
+            claims = None
+        st.session_state.sb_token_claims = (token, claims)
+    if claims and claims.get("exp", 0) <= time.time():
+        return None
+    return claims
+
+@traced("auth.ensure_session")
+def ensure_session(remote: bool = False) -> bool:
+    """Ensure Supabase client has a valid session. Returns True if user is authenticated.
+
+    The access token is validated locally; GoTrue is only contacted when the token is
+    missing, invalid or within AUTH_EXPIRY_MARGIN seconds of expiring, or when
+    ``remote=True`` (explicit actions such as inserting or triggering the pipeline).
+    """
     initialize_supabase()
     if not supabase:
         return False
 
+    token = st.session_state.sb_access_token
+    claims = access_token_claims(token) if token else None
+    if not remote and claims and claims.get("exp", 0) - AUTH_EXPIRY_MARGIN > time.time():
+        # Só ajusta o header do PostgREST; set_session faria um get_user no GoTrue.
+        supabase.postgrest.auth(token)
+        return True
+
     if st.session_state.sb_access_token and st.session_state.sb_refresh_token:
         try:
             supabase.auth.set_session(
@@ -568,6 +315,12 @@ def logout_user() -> None:
 
     st.session_state.sb_access_token = ""
     st.session_state.sb_refresh_token = ""
+    st.session_state.sb_token_claims = None
+
+def current_user_claims() -> Dict[str, Any]:
+    """Claims (sub, email, ...) of the session's access token, decoded locally."""
+    token = st.session_state.sb_access_token
+    return (access_token_claims(token) if token else None) or {}
 
 def auth_status_badge() -> str:
     """Return a short text with current ensure_session() status."""
@@ -588,7 +341,7 @@ def get_aws_credentials() -> Tuple[Optional[str], Optional[str], Optional[str],
 
 def trigger_lambda() -> Tuple[bool, str]:
     """Trigger Lambda function using boto3. Returns (success: bool, message: str)."""
-    if not ensure_session():
+    if not ensure_session(remote=True):
         return False, "Usuário não autenticado. Faça login para executar esta ação."
     
     aws_key, aws_secret, lambda_function_name, region = get_aws_credentials()
@@ -612,9 +365,7 @@ def trigger_lambda() -> Tuple[bool, str]:
         
         status_code = response.get("StatusCode")
         
-        if status_code == 202:
-            return True, f"Lambda '{lambda_function_name}' disparada com sucesso! Processamento iniciado em segundo plano."
-        else:
+        if status_code != 202:
             return False, f"Resposta inesperada da Lambda (Status: {status_code})"
             
     except Exception as e:
@@ -628,33 +379,252 @@ def trigger_lambda() -> Tuple[bool, str]:
         else:
             return False, "Erro ao disparar Lambda. Verifique as configurações."
 
+    # A Lambda já foi aceita: falhas no acompanhamento não podem virar erro de disparo.
+    try:
+        run_id = response.get("ResponseMetadata", {}).get("RequestId") or uuid.uuid4().hex
+        get_pipeline_tracker().start(run_id)
+        st.session_state.pipeline_run_id = run_id
+    except Exception:
+        logger.exception("Falha ao iniciar o acompanhamento da pipeline")
+    return True, f"Lambda '{lambda_function_name}' disparada com sucesso! Processamento iniciado em segundo plano."
+
+# -----------------------------------------------------------------------------
+# Acompanhamento das execuções da pipeline
+# -----------------------------------------------------------------------------
+PIPELINE_POLL_INTERVAL = float(os.environ.get("PIPELINE_POLL_INTERVAL", "15"))
+PIPELINE_TIMEOUT = float(os.environ.get("PIPELINE_TIMEOUT", "1800"))
+
+@dataclass
+class PipelineRun:
+    """One asynchronous Lambda invocation and what the watcher has seen of it.
+
+    ``versao`` is the last probed (count, latest update) of DASHBOARD_VIEW; the run is
+    done once that changed from ``versao_inicial`` and then held still for a poll.
+    """
+    run_id: str
+    iniciado_em: float
+    versao_inicial: Tuple[Optional[int], Optional[str]]
+    versao: Tuple[Optional[int], Optional[str]]
+    status: str = "executando"
+    concluido_em: Optional[float] = None
+
+class PipelineTracker:
+    """Tracks triggered pipeline runs and reloads the dataset store once per finished run.
+
+    A single daemon thread polls the DASHBOARD_VIEW version every PIPELINE_POLL_INTERVAL
+    seconds while any run is pending; runs that finish on the same poll share one refresh.
+    """
+
+    def __init__(self, store: "DatasetStore") -> None:
+        self.store = store
+        self.lock = threading.Lock()
+        self.runs: Dict[str, PipelineRun] = {}
+        # Só o próprio watcher volta isto a None, sob o lock, ao decidir sair: start() confia
+        # neste campo e não em is_alive(), que segue True enquanto o laço já está saindo.
+        self.watcher: Optional[threading.Thread] = None
+
+    def start(self, run_id: str) -> PipelineRun:
+        """Record a run triggered now and make sure the watcher is polling."""
+        versao = probe_view_version(DASHBOARD_VIEW)
+        run = PipelineRun(run_id=run_id, iniciado_em=time.time(), versao_inicial=versao, versao=versao)
+        with self.lock:
+            self.runs[run_id] = run
+            if self.watcher is None:
+                self.watcher = threading.Thread(target=self._watch, name="pipeline-watcher", daemon=True)
+                self.watcher.start()
+        return run
+
+    def get(self, run_id: str) -> Optional[PipelineRun]:
+        with self.lock:
+            return self.runs.get(run_id)
+
+    def _keep_watching(self) -> bool:
+        """Whether any run is pending; if none is, retire the watcher in the same critical section."""
+        with self.lock:
+            if any(run.status == "executando" for run in self.runs.values()):
+                return True
+            self.watcher = None
+            return False
+
+    def _watch(self) -> None:
+        while self._keep_watching():
+            time.sleep(PIPELINE_POLL_INTERVAL)
+            try:
+                versao = probe_view_version(DASHBOARD_VIEW)
+            except Exception:
+                logger.exception("Falha ao sondar a pipeline")
+                continue
+            agora = time.time()
+            concluidas = []
+            with self.lock:
+                for run in self.runs.values():
+                    if run.status != "executando":
+                        continue
+                    if run.versao != run.versao_inicial and versao == run.versao:
+                        concluidas.append(run)
+                    elif agora - run.iniciado_em > PIPELINE_TIMEOUT:
+                        run.status, run.concluido_em = "tempo_esgotado", agora
+                    run.versao = versao
+            if not concluidas:
+                continue
+            try:
+                self.store.refresh()
+                status = "concluido"
+            except Exception:
+                logger.exception("Falha ao recarregar dados após a pipeline")
+                status = "erro"
+            with self.lock:
+                for run in concluidas:
+                    run.status, run.concluido_em = status, time.time()
+
+@st.cache_resource
+def get_pipeline_tracker() -> PipelineTracker:
+    """Process-wide tracker, so a run is watched and reloaded once for every session."""
+    return PipelineTracker(get_dataset_store())
+
+@st.fragment(run_every=PIPELINE_POLL_INTERVAL)
+def render_pipeline_progress(run_id: str) -> None:
+    """Poll the tracked run; once it leaves "executando" rerun the app to show the new data."""
+    run = get_pipeline_tracker().get(run_id)
+    if run is None or run.status != "executando":
+        st.rerun(scope="app")
+    decorrido = int(time.time() - run.iniciado_em)
+    if run.versao != run.versao_inicial:
+        st.info(f"Pipeline em execução há {decorrido // 60} min {decorrido % 60:02d} s • recebendo resultados...")
+    else:
+        st.info(f"Pipeline em execução há {decorrido // 60} min {decorrido % 60:02d} s • aguardando resultados...")
+
+def render_pipeline_status() -> None:
+    """Show progress of the run this session triggered, or how it ended."""
+    run_id = st.session_state.get("pipeline_run_id")
+    if not run_id:
+        return
+    run = get_pipeline_tracker().get(run_id)
+    if run is None:
+        st.session_state.pipeline_run_id = None
+        return
+    if run.status == "executando":
+        render_pipeline_progress(run_id)
+        return
+    mensagens = {
+        "concluido": (st.success, "Pipeline concluída: dados do dashboard atualizados."),
+        "tempo_esgotado": (st.warning, "A pipeline não publicou resultados no tempo esperado. Use \"Recarregar Dados\" mais tarde."),
+        "erro": (st.error, "A pipeline terminou, mas houve falha ao recarregar os dados."),
+    }
+    show, texto = mensagens[run.status]
+    show(texto)
+    st.session_state.pipeline_run_id = None
+
 TARGET_YEAR = datetime.now().year
 
+# -----------------------------------------------------------------------------
+# Cache de consultas ao Supabase
+# -----------------------------------------------------------------------------
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", "30"))
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "1024"))
+# Tabelas cujas escritas também invalidam os datasets do DatasetStore.
+DATASET_TABLES = {"monitored_products"}
+
+class QueryCache:
+    """Read-through cache of Supabase query results with per-entry TTL and table tags.
+
+    Entries are keyed by a caller-built tuple and tagged with the tables they read;
+    ``invalidate`` drops every entry carrying a tag, so reads are fresh right after a write.
+    The cache holds at most QUERY_CACHE_SIZE entries (least recently used go first) and
+    expired ones are purged on every insert, so one-off keys do not pile up.
+    """
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE) -> None:
+        self.lock = threading.Lock()
+        # Valor: (ttl, resultado, tags); a expiração de cada entrada vem do próprio ttl.
+        self.entries: TLRUCache = TLRUCache(maxsize=maxsize, ttu=lambda _key, entry, now: now + entry[0], timer=time.monotonic)
+
+    def get(self, key: Tuple, fetch: Callable[[], Any], tags: Tuple[str, ...], ttl: float = QUERY_CACHE_TTL) -> Any:
+        """Return the cached result of ``key`` while fresh, calling ``fetch`` otherwise."""
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None:
+            return entry[1]
+        value = fetch()
+        with self.lock:
+            self.entries[key] = (ttl, value, frozenset(tags))
+        return value
+
+    def invalidate(self, tag: str) -> None:
+        """Drop every entry tagged with ``tag``."""
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if tag in entry[2]]:
+                del self.entries[key]
+
+@st.cache_resource
+def get_query_cache() -> QueryCache:
+    """Process-wide query cache shared by every session."""
+    return QueryCache()
+
+def cached_query(key: Tuple, fetch: Callable[[], Any], tags: Tuple[str, ...], ttl: float = QUERY_CACHE_TTL) -> Any:
+    """Run ``fetch`` through the process-wide query cache."""
+    return get_query_cache().get(key, fetch, tags, ttl)
+
+def cached_user_query(key: Tuple, fetch: Callable[[], Any], tags: Tuple[str, ...], ttl: float = QUERY_CACHE_TTL) -> Any:
+    """``cached_query`` for reads made with the session's authenticated client.
+
+    RLS filters those by user (CRIADO_POR), so the key carries the token's ``sub``: a
+    result fetched for one user is never served to another.
+    """
+    return cached_query((current_user_claims().get("sub"), *key), fetch, tags, ttl)
+
+def invalidate_table(table: str) -> None:
+    """Forget cached reads of ``table`` after a write, including the loaded datasets."""
+    get_query_cache().invalidate(table)
+    if table in DATASET_TABLES:
+        get_dataset_store().mark_stale()
+
+def normalize_product(produto: str, local: str) -> Tuple[str, str]:
+    """Normalise a (PRODUTO, LOCAL) pair the way monitored_products stores it."""
+    return produto.strip().upper(), local.strip()
+
+# Violação de unicidade do Postgres: o índice local pode estar defasado, o banco decide.
+UNIQUE_VIOLATION = "23505"
+
 def check_product_exists(produto: str, local: str) -> bool:
-    """Check if product already exists in monitored_products table."""
+    """Check if product already exists in monitored_products table.
+
+    Answered from the loaded calendar's key index when available; queries Supabase otherwise.
+    """
+    produto, local = normalize_product(produto, local)
+    known = get_dataset_store().has_product(produto, local)
+    if known is not None:
+        return known
     try:
         ensure_session()
-        response = (
-            supabase.table("monitored_products")
+        data = cached_user_query(
+            ("product_exists", produto, local),
+            lambda: supabase.table("monitored_products")
             .select("ID")
-            .eq("PRODUTO", produto.strip().upper())
-            .eq("LOCAL", local.strip())
+            .eq("PRODUTO", produto)
+            .eq("LOCAL", local)
             .execute()
+            .data,
+            tags=("monitored_products",),
         )
-        return bool(response.data)
+        return bool(data)
     except Exception:
         return False
 
-def insert_new_product(produto: str, local: str) -> bool:
-    """Insert a new product into monitored_products table."""
+def insert_new_product(produto: str, local: str) -> Tuple[bool, bool]:
+    """Insert a new product into monitored_products table.
+
+    Returns (success, already_exists); the second flag is set when the unique constraint
+    rejected a pair the local index did not know yet.
+    """
     try:
         ensure_session()
-        user_resp = supabase.auth.get_user()
-        user_id = user_resp.user.id if user_resp and getattr(user_resp, "user", None) else None
+        user_id = current_user_claims().get("sub")
 
+        produto, local = normalize_product(produto, local)
         payload = {
-            "PRODUTO": produto.strip().upper(),
-            "LOCAL": local.strip(),
+            "PRODUTO": produto,
+            "LOCAL": local,
             "STATUS": "ADICIONADO"
         }
         if user_id:
@@ -664,12 +634,115 @@ def insert_new_product(produto: str, local: str) -> bool:
 
         if hasattr(response, "error") and response.error:
             st.error(f"Erro Supabase (insert): {response.error}")
-            return False
-
-        return bool(response.data)
-    except Exception:
-        return False
+            return False, False
 
+        if response.data:
+            get_dataset_store().register_product(produto, local)
+            invalidate_table("monitored_products")
+        return bool(response.data), False
+    except Exception as e:
+        if getattr(e, "code", None) == UNIQUE_VIOLATION:
+            get_dataset_store().register_product(produto, local)
+            return False, True
+        return False, False
+
+BULK_INSERT_CHUNK = 100
+# Produtos por consulta "in" na checagem de duplicados (mantém a URL do PostgREST curta).
+BULK_LOOKUP_CHUNK = 150
+
+def read_bulk_file(uploaded: Any) -> pd.DataFrame:
+    """Read an uploaded CSV/XLSX into a frame with normalised PRODUTO and LOCAL columns."""
+    if uploaded.name.lower().endswith(".xlsx"):
+        df = pd.read_excel(uploaded, dtype=str)
+    else:
+        df = pd.read_csv(uploaded, dtype=str, sep=None, engine="python")
+    df.columns = [str(c).strip().upper() for c in df.columns]
+    if "PRODUTO" not in df.columns or "LOCAL" not in df.columns:
+        raise ValueError("A planilha precisa das colunas PRODUTO e LOCAL.")
+    df = df[["PRODUTO", "LOCAL"]].fillna("")
+    pares = [normalize_product(p, l) for p, l in zip(df["PRODUTO"], df["LOCAL"])]
+    return pd.DataFrame(pares, columns=["PRODUTO", "LOCAL"])
+
+def existing_products(pares: List[Tuple[str, str]]) -> set:
+    """Return which (PRODUTO, LOCAL) pairs already exist, with one "in" query per chunk of products."""
+    produtos = sorted({p for p, _ in pares})
+    existentes = set()
+    for i in range(0, len(produtos), BULK_LOOKUP_CHUNK):
+        response = (
+            supabase.table("monitored_products")
+            .select("PRODUTO, LOCAL")
+            .in_("PRODUTO", produtos[i:i + BULK_LOOKUP_CHUNK])
+            .execute()
+        )
+        existentes.update(normalize_product(r["PRODUTO"], r["LOCAL"] or "") for r in response.data or [])
+    return existentes & set(pares)
+
+def import_products_bulk(df: pd.DataFrame) -> pd.DataFrame:
+    """Insert the new rows of ``df`` in chunks; returns ``df`` with a per-row RESULTADO column."""
+    resultado = pd.Series("", index=df.index, dtype=object)
+    invalidos = (df["PRODUTO"] == "") | (df["LOCAL"] == "")
+    resultado[invalidos] = "inválido (campo vazio)"
+    repetidos = df.duplicated(["PRODUTO", "LOCAL"]) & ~invalidos
+    resultado[repetidos] = "repetido na planilha"
+
+    candidatos = df[resultado == ""]
+    existentes = existing_products(list(zip(candidatos["PRODUTO"], candidatos["LOCAL"])))
+    ja_cadastrados = [i for i, p, l in zip(candidatos.index, candidatos["PRODUTO"], candidatos["LOCAL"]) if (p, l) in existentes]
+    resultado[ja_cadastrados] = "já cadastrado"
+
+    novos = df[resultado == ""]
+    store = get_dataset_store()
+    user_id = current_user_claims().get("sub")
+    for start in range(0, len(novos), BULK_INSERT_CHUNK):
+        lote = novos.iloc[start:start + BULK_INSERT_CHUNK]
+        payload = [
+            {"PRODUTO": p, "LOCAL": l, "STATUS": "ADICIONADO", **({"CRIADO_POR": user_id} if user_id else {})}
+            for p, l in zip(lote["PRODUTO"], lote["LOCAL"])
+        ]
+        try:
+            # ON CONFLICT DO NOTHING: um par cadastrado entre a checagem e o insert (ou por outra
+            # sessão) não derruba o lote inteiro. Só as linhas inseridas voltam na resposta.
+            response = supabase.table("monitored_products").upsert(
+                payload, on_conflict="PRODUTO,LOCAL", ignore_duplicates=True
+            ).execute()
+            inseridos = {normalize_product(row["PRODUTO"], row["LOCAL"] or "") for row in response.data or []}
+            for i, p, l in zip(lote.index, lote["PRODUTO"], lote["LOCAL"]):
+                if normalize_product(p, l) in inseridos:
+                    resultado[i] = "inserido"
+                    store.register_product(p, l)
+                else:
+                    resultado[i] = "já cadastrado"
+        except Exception as e:
+            resultado[lote.index] = f"erro: {e}"
+    if (resultado == "inserido").any():
+        invalidate_table("monitored_products")
+    return df.assign(RESULTADO=resultado)
+
+def render_bulk_import() -> None:
+    """Render the CSV/XLSX upload that inserts many monitored products at once."""
+    with st.expander("Importar em lote (CSV/XLSX)", expanded=False):
+        st.caption("A planilha deve ter as colunas PRODUTO e LOCAL. Linhas já cadastradas são ignoradas.")
+        uploaded = st.file_uploader("Planilha", type=["csv", "xlsx"], key="bulk_upload")
+        if uploaded is None:
+            return
+        try:
+            df = read_bulk_file(uploaded)
+        except Exception as e:
+            st.error(f"Não foi possível ler a planilha: {e}")
+            return
+        st.caption(f"{len(df)} linha(s) lida(s).")
+
+        if st.button("Importar produtos", type="primary", use_container_width=True, key="bulk_import_button"):
+            if not ensure_session(remote=True):
+                st.error("Faça login para importar produtos.")
+                return
+            with st.spinner("Importando produtos..."):
+                relatorio = import_products_bulk(df)
+            contagem = relatorio["RESULTADO"].value_counts()
+            st.success(" • ".join(f"{qtd} {status}" for status, qtd in contagem.items()))
+            st.dataframe(relatorio, use_container_width=True, hide_index=True)
+
+@traced("render_product_insertion_form")
 def render_product_insertion_form() -> None:
     """Render product insertion form."""
     col1, col2 = st.columns(2)
@@ -697,36 +770,42 @@ def render_product_insertion_form() -> None:
             st.error("Preencha ambos os campos (Produto e Local).")
             return
 
-        if not ensure_session():
+        if not ensure_session(remote=True):
             st.error("Faça login para inserir/verificar produto.")
             return
 
-        with st.spinner("Verificando produto..."):
-            exists = check_product_exists(produto_input, local_input)
+        # Sem spinner: com os dados carregados a checagem é local e instantânea.
+        exists = check_product_exists(produto_input, local_input)
+        success = False
+        if not exists:
+            with st.spinner("Inserindo produto..."):
+                success, exists = insert_new_product(produto_input, local_input)
 
         if exists:
             st.error(f"O produto **{produto_input.upper()}** já está cadastrado para **{local_input}**.")
+        elif success:
+            st.success(f"Produto **{produto_input.upper()}** inserido com sucesso para **{local_input}**!")
+            st.info("O produto será processado automaticamente no próximo pipeline de análise.")
+            st.rerun()
         else:
-            with st.spinner("Inserindo produto..."):
-                success = insert_new_product(produto_input, local_input)
+            st.error("Erro ao inserir o produto. Tente novamente.")
+            st.caption("Se o erro persistir, verifique permissões RLS e o campo CRIADO_POR.")
 
-            if success:
-                st.success(f"Produto **{produto_input.upper()}** inserido com sucesso para **{local_input}**!")
-                st.info("O produto será processado automaticamente no próximo pipeline de análise.")
-                st.rerun()
-            else:
-                st.error("Erro ao inserir o produto. Tente novamente.")
-                st.caption("Se o erro persistir, verifique permissões RLS e o campo CRIADO_POR.")
+    render_bulk_import()
 
     st.markdown("---")
     section_subtitle("Produtos Recentes Adicionados")
 
     with st.container():
         try:
-            recent_response = supabase.table("monitored_products").select("PRODUTO, LOCAL, STATUS, DATA_CRIACAO").eq("STATUS", "ADICIONADO").order("DATA_CRIACAO", desc=True).limit(10).execute()
+            recent = cached_user_query(
+                ("recent_products", 10),
+                lambda: supabase.table("monitored_products").select("PRODUTO, LOCAL, STATUS, DATA_CRIACAO").eq("STATUS", "ADICIONADO").order("DATA_CRIACAO", desc=True).limit(10).execute().data,
+                tags=("monitored_products",),
+            )
 
-            if recent_response.data:
-                recent_df = pd.DataFrame(recent_response.data)
+            if recent:
+                recent_df = pd.DataFrame(recent)
                 recent_df['DATA_CRIACAO'] = pd.to_datetime(recent_df['DATA_CRIACAO']).dt.strftime('%d/%m/%Y %H:%M')
 
                 st.dataframe(
@@ -743,6 +822,7 @@ def render_product_insertion_form() -> None:
         except Exception as e:
             st.error(f"Erro ao carregar produtos recentes: {e}")
 
+@traced("render_insert_product_view")
 def render_insert_product_view() -> None:
     """Render product insertion view."""
 
@@ -817,17 +897,13 @@ def render_insert_product_view() -> None:
                 success, message = trigger_lambda()
                 if success:
                     st.success(f"{message}")
-                    st.info("O processamento pode levar alguns minutos. Os resultados aparecerão no dashboard quando concluído.")
+                    st.info("O processamento pode levar alguns minutos. O dashboard será recarregado automaticamente quando os resultados chegarem.")
                 else:
                     st.error(f"{message}")
         
         return
 
-    try:
-        user_resp = supabase.auth.get_user()
-        user_email = user_resp.user.email if user_resp and getattr(user_resp, "user", None) else st.session_state.user_email
-    except:
-        user_email = st.session_state.user_email or "Usuário"
+    user_email = current_user_claims().get("email") or st.session_state.user_email or "Usuário"
 
     st.success(f"Logado como: {user_email}")
 
@@ -858,7 +934,7 @@ def render_insert_product_view() -> None:
             success, message = trigger_lambda()
             if success:
                 st.success(f"{message}")
-                st.info("O processamento pode levar alguns minutos. Os resultados aparecerão no dashboard quando concluído.")
+                st.info("O processamento pode levar alguns minutos. O dashboard será recarregado automaticamente quando os resultados chegarem.")
             else:
                 st.error(f"{message}")
 
@@ -868,88 +944,1149 @@ def section_title(text: str) -> None:
 def section_subtitle(text: str) -> None:
     st.markdown(f'<div class="section-subtitle">{text}</div>', unsafe_allow_html=True)
 
-@st.cache_data
-def load_data() -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
-    """Load calendar and analysis data from Supabase."""
-    initialize_supabase()
-    if not supabase:
-        st.error("Conexão com Supabase não configurada.")
-        return None, None
+# -----------------------------------------------------------------------------
+# Modelos tipados dos dados carregados
+# -----------------------------------------------------------------------------
+def _texto(value: Any) -> str:
+    return value.strip() if isinstance(value, str) else ("" if value is None else str(value))
+
+@pydantic_dataclass(slots=True, frozen=True)
+class Link:
+    """A news source cited by an analysis."""
+    titulo: str = ""
+    url: str = ""
+    data: Optional[str] = None
+
+    @field_validator("titulo", "url", mode="before")
+    @classmethod
+    def _normalize_text(cls, value: Any) -> str:
+        return _texto(value)
+
+    @field_validator("data", mode="before")
+    @classmethod
+    def _normalize_data(cls, value: Any) -> Optional[str]:
+        # Datas chegam como texto, número (20250101) ou vazias: nenhuma invalida a análise.
+        return _texto(value) or None
+
+@pydantic_dataclass(slots=True, frozen=True)
+class Analysis:
+    """One RESULTADO entry of vw_dashboard_products, normalised once at load time."""
+    produto: str
+    pais: str = ""
+    sentimento: str = "NEUTRO"
+    resumo: str = ""
+    links: Tuple[Link, ...] = ()
+    produto_key: str = ""
+
+    @field_validator("produto", "pais", "resumo", mode="before")
+    @classmethod
+    def _normalize_text(cls, value: Any) -> str:
+        return _texto(value)
+
+    @field_validator("sentimento", mode="before")
+    @classmethod
+    def _normalize_sentimento(cls, value: Any) -> str:
+        return _texto(value).upper() or "NEUTRO"
+
+    @field_validator("links", mode="before")
+    @classmethod
+    def _normalize_links(cls, value: Any) -> Any:
+        return () if value is None else value
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "produto_key", self.produto.upper())
+
+@dataclass(slots=True, frozen=True)
+class CalendarEntry:
+    """One product/origin pair of vw_monitored_products.
+
+    ``meses`` is the harvest window as a 12-bit mask: bit 0 is JAN, bit 11 is DEZ.
+    """
+    produto: str
+    local: str
+    meses: int
+    no_relatorio: bool = False
+    produto_key: str = field(init=False, default="")
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "produto_key", self.produto.upper())
+
+ANALYSES_ADAPTER = TypeAdapter(List[Analysis])
+ANALYSES_JSON_ADAPTER = TypeAdapter(List[Json[Analysis]])
+
+
+# Colunas projetadas por view: evita trafegar colunas que nenhuma tela usa.
+VIEW_KEY_COLUMN = "ID"
+VIEW_UPDATED_COLUMN = "DATA_ATUALIZACAO"
+DASHBOARD_VIEW = "vw_dashboard_products"
+DASHBOARD_COLUMNS = "ID, PRODUTO, RESULTADO, DATA_ATUALIZACAO"
+CALENDAR_VIEW = "vw_monitored_products"
+CALENDAR_COLUMNS = "ID, PRODUTO, LOCAL, COLHEITA, DATA_ATUALIZACAO"
+PAGE_SIZE = int(os.environ.get("SUPABASE_PAGE_SIZE", "1000"))
+# Intervalo (segundos) entre sondagens de versão dos dados.
+DATA_VERSION_TTL = float(os.environ.get("DATA_VERSION_TTL", "60"))
+# Teto (segundos) da espera exponencial entre sondagens depois de falhas seguidas.
+PROBE_BACKOFF_MAX = float(os.environ.get("DATA_PROBE_BACKOFF_MAX", "600"))
+FETCH_WORKERS = int(os.environ.get("SUPABASE_FETCH_WORKERS", "6"))
+# Chaves por filtro in_ ao buscar linhas que o delta não trouxe (limite prático da URL).
+KEY_LOOKUP_CHUNK = 200
+# Último conjunto de dados bom, servido no cold start e em quedas do Supabase.
+SNAPSHOT_DIR = os.environ.get("DASHBOARD_SNAPSHOT_DIR", ".dashboard_snapshot")
+# Opcional: diretório compartilhado pelos workers do mesmo host (ex.: /dev/shm/dashboard-safra).
+# Só um worker por host consulta o Supabase; os demais mapeiam os arquivos Arrow que ele publica.
+SHARED_DIR = os.environ.get("DASHBOARD_SHARED_DIR", "")
+
+MAPA_MESES = {
+    "JAN": 1, "FEV": 2, "MAR": 3, "ABR": 4, "MAI": 5, "JUN": 6,
+    "JUL": 7, "AGO": 8, "SET": 9, "OUT": 10, "NOV": 11, "DEZ": 12
+}
+TODOS_OS_MESES = (1 << 12) - 1
 
+def fetch_view_pages(
+    view: str,
+    columns: str,
+    page_size: int = PAGE_SIZE,
+    since: Optional[str] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield pages of a view using keyset pagination on VIEW_KEY_COLUMN.
+
+    With ``since``, only rows whose VIEW_UPDATED_COLUMN is at or after that watermark are returned.
+    """
+    last_key = None
+    while True:
+        query = get_reader_client().table(view).select(columns).order(VIEW_KEY_COLUMN).limit(page_size)
+        if since is not None:
+            query = query.gte(VIEW_UPDATED_COLUMN, since)
+        if last_key is not None:
+            query = query.gt(VIEW_KEY_COLUMN, last_key)
+        page = query.execute().data or []
+        # Para somente na página vazia: o max-rows do PostgREST pode ser menor que page_size.
+        if not page:
+            return
+        yield page
+        last_key = page[-1][VIEW_KEY_COLUMN]
+
+def fetch_view_range(view: str, columns: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """Fetch rows ``start..end`` (inclusive) of a view ordered by VIEW_KEY_COLUMN."""
+    rows: List[Dict[str, Any]] = []
+    while start <= end:
+        page = (
+            get_reader_client().table(view).select(columns).order(VIEW_KEY_COLUMN)
+            .range(start, end).execute().data or []
+        )
+        # O max-rows do PostgREST pode devolver menos que o intervalo pedido.
+        if not page:
+            break
+        rows.extend(page)
+        start += len(page)
+    return rows
+
+def collect_view_rows(view: str, columns: str, since: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Fetch all (or, with ``since``, only changed) rows of a view via keyset pagination."""
+    return [row for page in fetch_view_pages(view, columns, since=since) for row in page]
+
+def fetch_view_keys(view: str) -> set:
+    """Return the set of keys currently present in a view (key-only projection)."""
+    keys = set()
+    for page in fetch_view_pages(view, VIEW_KEY_COLUMN):
+        keys.update(row[VIEW_KEY_COLUMN] for row in page)
+    return keys
+
+def fetch_view_rows_by_keys(view: str, columns: str, keys: List[Any]) -> List[Dict[str, Any]]:
+    """Fetch the rows of ``keys`` with chunked ``in_`` filters on VIEW_KEY_COLUMN."""
+    rows: List[Dict[str, Any]] = []
+    for i in range(0, len(keys), KEY_LOOKUP_CHUNK):
+        rows.extend(
+            get_reader_client().table(view).select(columns)
+            .in_(VIEW_KEY_COLUMN, keys[i:i + KEY_LOOKUP_CHUNK])
+            .execute().data or []
+        )
+    return rows
+
+def probe_view_version(view: str) -> Tuple[Optional[int], Optional[str]]:
+    """Return (row count, max VIEW_UPDATED_COLUMN) of a view with a single one-row query."""
+    response = (
+        get_reader_client().table(view)
+        .select(VIEW_UPDATED_COLUMN, count="exact")
+        .order(VIEW_UPDATED_COLUMN, desc=True, nullsfirst=False)
+        .limit(1)
+        .execute()
+    )
+    latest = response.data[0].get(VIEW_UPDATED_COLUMN) if response.data else None
+    return response.count, latest
+
+def probe_data_version() -> Tuple[Tuple[Optional[int], Optional[str]], ...]:
+    """Version key of the whole dataset: count and latest update of each view."""
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="supabase-probe") as pool:
+        futures = [submit_traced(pool, "fetch.sonda", probe_view_version, view, view=view) for view in (DASHBOARD_VIEW, CALENDAR_VIEW)]
+        return tuple(future.result() for future in futures)
+
+def validate_batch(adapter: TypeAdapter, items: List[Any]) -> Tuple[List[Any], Dict[int, str]]:
+    """Validate a list with ``adapter`` in one pass, collecting per-item errors.
+
+    Returns the validated items (None where invalid) and the error message of each
+    invalid item keyed by its index.
+    """
+    try:
+        return adapter.validate_python(items), {}
+    except ValidationError as e:
+        errors: Dict[int, str] = {}
+        for err in e.errors():
+            campo = ".".join(str(p) for p in err["loc"][1:]) or "RESULTADO"
+            errors.setdefault(err["loc"][0], f"{campo}: {err['msg']}")
+    validos = [i for i in range(len(items)) if i not in errors]
+    result: List[Any] = [None] * len(items)
+    for i, item in zip(validos, adapter.validate_python([items[i] for i in validos])):
+        result[i] = item
+    return result, errors
+
+def parse_analysis_rows(page: List[Dict[str, Any]]) -> Tuple[List[Optional[Analysis]], Dict[int, str]]:
+    """Decode and validate the RESULTADO of a page of vw_dashboard_products rows in batch.
+
+    Returns one Analysis (or None for empty/malformed rows) per input row, plus the
+    validation error of each malformed row keyed by its position in ``page``.
+    """
+    parsed: List[Optional[Analysis]] = [None] * len(page)
+    errors: Dict[int, str] = {}
+    # RESULTADO chega como texto JSON ou já decodificado (jsonb): um lote por formato.
+    for adapter, is_json in ((ANALYSES_JSON_ADAPTER, True), (ANALYSES_ADAPTER, False)):
+        positions = [
+            i for i, row in enumerate(page)
+            if row.get("RESULTADO") and isinstance(row["RESULTADO"], (str, bytes)) == is_json
+        ]
+        if not positions:
+            continue
+        validated, batch_errors = validate_batch(adapter, [page[i]["RESULTADO"] for i in positions])
+        for pos, analise in zip(positions, validated):
+            parsed[pos] = analise
+        for idx, msg in batch_errors.items():
+            errors[positions[idx]] = msg
+    return parsed, errors
+
+def parse_calendar_rows(page: List[Dict[str, Any]]) -> Tuple[List[CalendarEntry], Dict[int, str]]:
+    """Build the CalendarEntry of each vw_monitored_products row of a page."""
+    return [parse_calendar_row(row) for row in page], {}
+
+def parse_calendar_row(row: Dict[str, Any]) -> CalendarEntry:
+    """Expand the COLHEITA window of a vw_monitored_products row into active months."""
+    produto = (row.get("PRODUTO") or "").strip()
+    safra = row.get("COLHEITA", "")
+    local = (row.get("LOCAL") or "").strip()
+
+    return CalendarEntry(produto=produto, local=local, meses=harvest_mask(safra))
+
+def harvest_mask(safra: Any) -> int:
+    """Encode a COLHEITA window such as "OUT-FEV" as a 12-bit mask (bit 0 = JAN)."""
+    if not safra or not isinstance(safra, str):
+        return 0
+    partes = [p.strip().upper() for p in safra.split('-')]
+    if len(partes) != 2 or partes[0] not in MAPA_MESES or partes[1] not in MAPA_MESES:
+        return 0
+    ini = MAPA_MESES[partes[0]] - 1
+    fim = MAPA_MESES[partes[1]] - 1
+    if ini <= fim:
+        return ((1 << (fim - ini + 1)) - 1) << ini
+    # Janela que cruza a virada do ano: de ini até DEZ e de JAN até fim.
+    return (TODOS_OS_MESES & ~((1 << ini) - 1)) | ((1 << (fim + 1)) - 1)
+
+@traced("assemble.calendario")
+def build_month_index(produtos: List[CalendarEntry]) -> Dict[str, Tuple[int, ...]]:
+    """Map each month key to the positions in ``produtos`` harvesting in it, tracked first."""
+    por_mes: Dict[str, List[int]] = {m: [] for m in MESES}
+    for pos, item in enumerate(produtos):
+        meses = item.meses
+        while meses:
+            bit = meses & -meses
+            por_mes[MESES[bit.bit_length() - 1]].append(pos)
+            meses ^= bit
+    return {
+        mes: tuple(sorted(posicoes, key=lambda p: not produtos[p].no_relatorio))
+        for mes, posicoes in por_mes.items()
+    }
+
+@traced("assemble.tabela")
+def build_analysis_table(analises: List[Analysis]) -> pd.DataFrame:
+    """Columnar view of the analyses; row ``i`` is ``analises[i]``."""
+    return pd.DataFrame({
+        "produto": pd.Categorical([a.produto for a in analises]),
+        "pais": pd.Categorical([a.pais for a in analises]),
+        "sentimento": pd.Categorical([a.sentimento for a in analises]),
+    })
+
+# -----------------------------------------------------------------------------
+# Busca textual nas análises
+# -----------------------------------------------------------------------------
+# Peso de cada campo no ranking: achar o termo no nome do produto vale mais que no resumo.
+PESOS_BUSCA = {"produto": 5.0, "pais": 3.0, "links": 2.0, "resumo": 1.0}
+_TOKEN_RE = re.compile(r"\w+")
+# Diacríticos combinantes (U+0300–U+036F) que sobram após a decomposição NFKD.
+_COMBINING_RE = re.compile("[\u0300-\u036f]")
+
+def normalize_search_text(text: str) -> str:
+    """Casefold and strip accents, so "Geada" and "géada" index to the same token."""
+    if text.isascii():
+        return text.casefold()
+    return _COMBINING_RE.sub("", unicodedata.normalize("NFKD", text.casefold()))
+
+def search_tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize_search_text(text))
+
+def document_terms(a: Analysis) -> Dict[str, float]:
+    """Summed field weight of each token of an analysis."""
+    termos: Dict[str, float] = {}
+    campos = (
+        ("produto", a.produto),
+        ("pais", a.pais),
+        ("resumo", a.resumo),
+        ("links", " ".join(link.titulo for link in a.links)),
+    )
+    for campo, texto in campos:
+        peso = PESOS_BUSCA[campo]
+        # Counter conta as repetições em C; o laço Python passa só pelos tokens distintos.
+        for token, vezes in Counter(search_tokens(texto)).items():
+            termos[token] = termos.get(token, 0.0) + vezes * peso
+    return termos
+
+class SearchIndex:
+    """Inverted index over produto, pais, resumo and link titles of the analyses.
+
+    Postings are keyed by row ID, so ``updated`` re-indexes only the rows that changed and
+    shares everything else with the previous index. Query terms are matched as
+    accent-insensitive prefixes; every term must match (AND) and hits are ranked by the
+    summed field weights of the matching postings.
+    """
+
+    __slots__ = ("vocab", "postings", "keys", "analises", "positions")
+
+    def __init__(
+        self,
+        keys: List[Any],
+        analises: Sequence,
+        postings: Optional[Dict[str, Dict[Any, float]]] = None,
+        vocab: Optional[List[str]] = None,
+    ) -> None:
+        self.keys = keys
+        self.analises = analises
+        self.positions = {key: pos for pos, key in enumerate(keys)}
+        if postings is None:
+            postings = {}
+            for key, a in zip(keys, analises):
+                for token, peso in document_terms(a).items():
+                    postings.setdefault(token, {})[key] = peso
+        self.postings = postings
+        self.vocab = sorted(postings) if vocab is None else vocab
+
+    def updated(self, keys: List[Any], analises: Sequence, changed: set) -> "SearchIndex":
+        """New index for ``keys``/``analises`` in which only the ``changed`` rows are re-indexed."""
+        postings = dict(self.postings)
+        copiados: set = set()
+        vocab_mudou = False
+
+        def bucket(token: str) -> Dict[Any, float]:
+            nonlocal vocab_mudou
+            if token not in copiados:
+                vocab_mudou |= token not in postings
+                # Cópia por token: o índice anterior continua intacto para quem ainda o lê.
+                postings[token] = dict(postings.get(token, {}))
+                copiados.add(token)
+            return postings[token]
+
+        novas_posicoes = {key: pos for pos, key in enumerate(keys)}
+        for key in changed:
+            pos = self.positions.get(key)
+            if pos is not None:
+                for token in document_terms(self.analises[pos]):
+                    bucket(token).pop(key, None)
+            pos = novas_posicoes.get(key)
+            if pos is not None:
+                for token, peso in document_terms(analises[pos]).items():
+                    bucket(token)[key] = peso
+        for token in copiados:
+            if not postings[token]:
+                del postings[token]
+                vocab_mudou = True
+        return SearchIndex(keys, analises, postings, None if vocab_mudou else self.vocab)
+
+    def _prefix_scores(self, prefix: str) -> Dict[Any, float]:
+        scores: Dict[Any, float] = {}
+        i = bisect_left(self.vocab, prefix)
+        while i < len(self.vocab) and self.vocab[i].startswith(prefix):
+            for key, peso in self.postings[self.vocab[i]].items():
+                scores[key] = scores.get(key, 0.0) + peso
+            i += 1
+        return scores
+
+    def search(self, query: str) -> List[int]:
+        """Return the positions of the matching analyses, best match first."""
+        termos = search_tokens(query)
+        if not termos:
+            return []
+        scores = self._prefix_scores(termos[0])
+        for termo in termos[1:]:
+            if not scores:
+                break
+            extra = self._prefix_scores(termo)
+            scores = {key: s + extra[key] for key, s in scores.items() if key in extra}
+        hits = {self.positions[key]: s for key, s in scores.items()}
+        return sorted(hits, key=lambda pos: (-hits[pos], pos))
+
+@dataclass(slots=True, frozen=True)
+class CalendarItem:
+    """A product as shown inside a month card of the calendar list."""
+    nome: str
+    local: str
+    tracked: bool
+    emoji: str
+
+@dataclass(slots=True, frozen=True)
+class DashboardViewModel:
+    """Everything the screens read, derived once per dataset version."""
+    versao: str
+    total_produtos: int
+    produtos_rastreados: int
+    total_analises: int
+    sentimentos: Dict[str, int]
+    alertas: Sequence
+    por_sentimento: Dict[str, np.ndarray]
+    paises: Tuple[str, ...]
+    calendario: Dict[str, Tuple[CalendarItem, ...]]
+
+SENTIMENTOS = ["POSITIVO", "NEUTRO", "NEGATIVO"]
+EMOJI_SENTIMENTO = {"POSITIVO": "🟢", "NEUTRO": "⚪", "NEGATIVO": "🔴"}
+
+@traced("assemble.view_model")
+def build_view_model(calendar_data: Dict[str, Any], analysis_data: Dict[str, Any]) -> DashboardViewModel:
+    """Precompute metrics, alert list, sentiment groups, facets and calendar buckets."""
+    analises = analysis_data["analises"]
+    tabela = analysis_data["tabela"]
+    produtos = calendar_data["produtos"]
+    contagem = tabela["sentimento"].value_counts()
+    nomes = tabela["produto"].to_numpy()
+    sentimentos = tabela["sentimento"].to_numpy()
+    # Lido das colunas da tabela, não das análises: se estas vêm do Arrow, nenhuma é construída aqui.
+    mapa_sent = {str(nome).upper(): sent for nome, sent in zip(nomes, sentimentos)}
+    negativas = np.flatnonzero(sentimentos == "NEGATIVO")
+    # Um CalendarItem por produto, compartilhado por todos os meses da sua janela de colheita.
+    itens = [
+        CalendarItem(
+            nome=item.produto,
+            local=item.local or "Origem não informada",
+            tracked=item.no_relatorio,
+            emoji=EMOJI_SENTIMENTO.get(mapa_sent.get(item.produto_key), "•") if item.no_relatorio else "○",
+        )
+        for item in produtos
+    ]
+    return DashboardViewModel(
+        versao=f"{time.time_ns():x}",
+        total_produtos=len(produtos),
+        produtos_rastreados=sum(1 for p in produtos if p.no_relatorio),
+        total_analises=len(analises),
+        sentimentos={sent: int(contagem.get(sent, 0)) for sent in SENTIMENTOS},
+        alertas=select_analyses(analises, negativas[np.argsort(nomes[negativas], kind="stable")]),
+        por_sentimento={sent: np.flatnonzero(sentimentos == sent) for sent in SENTIMENTOS},
+        paises=tuple(p for p in tabela["pais"].cat.categories if p),
+        calendario={mes: tuple(itens[p] for p in posicoes) for mes, posicoes in calendar_data["por_mes"].items()},
+    )
+
+def read_shared_pointer() -> Optional[Dict[str, Any]]:
+    """Return the CURRENT.json pointer of SHARED_DIR, or None if nothing was published."""
     try:
-        dashboard_response = supabase.table("vw_dashboard_products").select("*").execute()
-        dashboard_rows = dashboard_response.data or []
+        with open(os.path.join(SHARED_DIR, "CURRENT.json"), encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+def write_shared_pointer(pointer: Dict[str, Any]) -> None:
+    """Atomically replace CURRENT.json so readers never see a half-written pointer."""
+    path = os.path.join(SHARED_DIR, "CURRENT.json")
+    with open(f"{path}.{os.getpid()}.tmp", "w", encoding="utf-8") as fh:
+        json.dump(pointer, fh)
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+@contextmanager
+def shared_refresh_lock(blocking: bool) -> Iterator[bool]:
+    """Cross-process lock electing the worker that refreshes from Supabase; yields whether it was acquired."""
+    import fcntl
+
+    os.makedirs(SHARED_DIR, exist_ok=True)
+    with open(os.path.join(SHARED_DIR, "refresh.lock"), "w") as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+def trusted_instance(cls: type, **values: Any) -> Any:
+    """Instantiate a frozen dataclass without running its validators.
+
+    Only for values this process validated before and wrote itself (snapshots and shared
+    files): re-validating 100k analyses costs seconds on a warm start.
+    """
+    obj = object.__new__(cls)
+    for nome, valor in values.items():
+        object.__setattr__(obj, nome, valor)
+    return obj
+
+def analysis_rows(tabela: pa.Table) -> Iterator[Tuple[Any, Optional[Analysis]]]:
+    """(ID, analysis) for each row of an analises snapshot table (None for invalid rows)."""
+    colunas = [tabela.column(nome).to_pylist() for nome in ("ID", "produto", "pais", "sentimento", "resumo", "links")]
+    for key, produto, pais, sentimento, resumo, links in zip(*colunas):
+        if produto is None:
+            yield key, None
+            continue
+        yield key, trusted_instance(
+            Analysis,
+            produto=produto,
+            pais=pais,
+            sentimento=sentimento,
+            resumo=resumo,
+            links=tuple(trusted_instance(Link, **link) for link in json.loads(links)),
+            produto_key=produto.upper(),
+        )
+
+def analyses_from_snapshot(tabela: pa.Table) -> Dict[Any, Optional[Analysis]]:
+    """Rebuild the analyses of an analises snapshot table keyed by ID (None for invalid rows)."""
+    return dict(analysis_rows(tabela))
 
-        calendar_response = supabase.table("vw_monitored_products").select("*").execute()
-        calendar_rows = calendar_response.data or []
+class ArrowAnalyses(Sequence):
+    """Read-only sequence of analyses backed by an analises snapshot table.
 
+    Item ``i`` is row ``linhas[i]`` of the table, built on access: resumo and links stay in
+    the Arrow buffers (memory-mapped in SHARED_DIR mode) and only the cards on screen become
+    Python objects. Slices and ``take`` return new views over the same table.
+    """
+
+    __slots__ = ("tabela", "linhas")
+    # Linhas convertidas por vez ao iterar.
+    LOTE = 1024
+
+    def __init__(self, tabela: pa.Table, linhas: np.ndarray) -> None:
+        self.tabela = tabela
+        self.linhas = linhas
+
+    def __len__(self) -> int:
+        return len(self.linhas)
+
+    def __getitem__(self, i: Any) -> Any:
+        if isinstance(i, slice):
+            return ArrowAnalyses(self.tabela, self.linhas[i])
+        return next(analysis_rows(self.tabela.slice(int(self.linhas[i]), 1)))[1]
+
+    def __iter__(self) -> Iterator[Analysis]:
+        for inicio in range(0, len(self.linhas), self.LOTE):
+            for _, a in analysis_rows(self.tabela.take(self.linhas[inicio:inicio + self.LOTE])):
+                yield a
+
+    def take(self, posicoes: np.ndarray) -> "ArrowAnalyses":
+        return ArrowAnalyses(self.tabela, self.linhas[posicoes])
+
+def select_analyses(analises: Sequence, posicoes: np.ndarray) -> Sequence:
+    """The analyses at ``posicoes``; an ArrowAnalyses stays a lazy view."""
+    if isinstance(analises, ArrowAnalyses):
+        return analises.take(posicoes)
+    return tuple(analises[i] for i in posicoes)
+
+def arrow_analysis_parts(tabela: pa.Table) -> Tuple[List[Any], ArrowAnalyses, pd.DataFrame]:
+    """Keys, lazy analyses and categorical table of the valid rows of an analises table, by ID."""
+    ordem = pc.sort_indices(tabela, sort_keys=[("ID", "ascending")]).to_numpy()
+    validas = tabela.column("produto").is_valid().to_numpy(zero_copy_only=False)
+    linhas = ordem[validas[ordem]]
+    colunas = {}
+    for nome in ("produto", "pais", "sentimento"):
+        coluna = tabela.column(nome).take(linhas).combine_chunks().dictionary_encode().to_pandas()
+        # Mesma ordem de categorias que build_analysis_table (pd.Categorical ordena).
+        colunas[nome] = coluna.cat.reorder_categories(coluna.cat.categories.sort_values())
+    keys = tabela.column("ID").take(linhas).to_pylist()
+    return keys, ArrowAnalyses(tabela, linhas), pd.DataFrame(colunas)
+
+def calendar_from_snapshot(tabela: pa.Table) -> Dict[Any, CalendarEntry]:
+    """Rebuild the calendar entries of a calendario snapshot table keyed by ID."""
+    colunas = [tabela.column(nome).to_pylist() for nome in ("ID", "produto", "local", "meses")]
+    return {
+        key: trusted_instance(CalendarEntry, produto=produto, local=local, meses=meses, no_relatorio=False, produto_key=produto.upper())
+        for key, produto, local, meses in zip(*colunas)
+    }
+
+def fill_future(future: Future, build: Callable[[], Any]) -> None:
+    """Run ``build`` and store its result (or the exception it raised) in ``future``."""
+    try:
+        future.set_result(build())
+    except BaseException as e:
+        future.set_exception(e)
+
+def resolved(value: Any) -> Future:
+    """A Future already holding ``value``."""
+    future: Future = Future()
+    future.set_result(value)
+    return future
+
+class DatasetStore:
+    """Parsed rows of both views, keyed by ID, with per-view update watermarks.
+
+    The first ``refresh`` downloads everything; later ones fetch rows changed since the
+    watermark and, when the view's probed version changed (or on a forced refresh), scan
+    its keys to drop rows that disappeared and fetch rows the watermark missed (NULL or
+    older DATA_ATUALIZACAO). Only the derived structures whose rows changed are rebuilt.
+    ``sync`` probes the data version at most every DATA_VERSION_TTL seconds and only
+    refreshes when it changed; after a failed probe it backs off exponentially (up to
+    PROBE_BACKOFF_MAX) instead of retrying on every rerun. Every refresh is persisted as a Parquet snapshot in
+    SNAPSHOT_DIR, which ``warm_start`` serves after a restart while a background
+    revalidation catches up with Supabase. With DASHBOARD_SHARED_DIR set, there is a single
+    fetcher per host: the worker holding the refresh lock talks to Supabase and publishes
+    Arrow IPC files, the others memory-map those files instead of downloading. A restored
+    dataset (snapshot or shared files) is served straight from its Arrow table: resumo and
+    links live in the mapped pages, shared by every worker of the host, and each worker only
+    keeps small per-row structures (keys, categorical codes, calendar, search index). The
+    analyses become Python rows again only when that worker itself has to refresh.
+    """
+
+    PARSERS = {
+        DASHBOARD_VIEW: (DASHBOARD_COLUMNS, parse_analysis_rows),
+        CALENDAR_VIEW: (CALENDAR_COLUMNS, parse_calendar_rows),
+    }
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.rows: Dict[str, Dict[Any, Any]] = {view: {} for view in self.PARSERS}
+        self.watermarks: Dict[str, Optional[str]] = {view: None for view in self.PARSERS}
+        self.errors: Dict[Any, Dict[str, Any]] = {}
+        # Tabela de análises restaurada e ainda não convertida em rows[DASHBOARD_VIEW]: as telas
+        # leem dela direto, e só um refresh (que precisa comparar linhas) a materializa.
+        self.analyses_table: Optional[pa.Table] = None
+        # Chaves inseridas, alteradas ou removidas desde o último _assemble, por view.
+        self.changed: Dict[str, set] = {view: set() for view in self.PARSERS}
+        self.datasets: Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]] = (None, None)
+        self.version: Optional[Tuple] = None
+        self.probed_at = 0.0
+        self.stale = False
+        self.shared_id: Optional[str] = None
+        # Falhas seguidas de sonda/refresh e o instante (monotonic) da próxima tentativa.
+        self.failures = 0
+        self.retry_at = 0.0
+        self.revalidating = False
+
+    @property
+    def calendar_data(self) -> Optional[Dict[str, Any]]:
+        return self.datasets[0]
+
+    @property
+    def analysis_data(self) -> Optional[Dict[str, Any]]:
+        return self.datasets[1]
+
+    def mark_stale(self) -> None:
+        """Make the next ``sync`` probe Supabase regardless of DATA_VERSION_TTL."""
+        self.stale = True
+
+    def probe_due(self) -> bool:
+        """Whether a ``sync`` would contact Supabase now (outside of a failure backoff)."""
+        agora = time.monotonic()
+        if agora < self.retry_at:
+            return False
+        return self.stale or agora - self.probed_at >= DATA_VERSION_TTL
+
+    def _probe_failed(self) -> None:
+        self.failures += 1
+        espera = min(PROBE_BACKOFF_MAX, DATA_VERSION_TTL * 2 ** (self.failures - 1))
+        self.retry_at = time.monotonic() + espera
+        logger.warning("Sonda do Supabase falhou (%d seguidas); próxima tentativa em %.0f s", self.failures, espera)
+
+    def has_product(self, produto: str, local: str) -> Optional[bool]:
+        """Whether the normalised pair is monitored, or None while no calendar is loaded."""
+        calendar = self.calendar_data
+        if calendar is None:
+            return None
+        return normalize_product(produto, local) in calendar["chaves"]
+
+    def register_product(self, produto: str, local: str) -> None:
+        """Record a freshly inserted pair until the next refresh brings it from the view."""
+        calendar = self.calendar_data
+        if calendar is not None:
+            calendar["chaves"].add(normalize_product(produto, local))
+
+    def refresh(self) -> None:
+        """Fetch what changed since the last refresh (everything on the first call)."""
+        with self.lock:
+            if SHARED_DIR:
+                self._sync_shared(0, force=True)
+            else:
+                self._refresh(probe_data_version(), scan_keys=True)
+
+    def sync(self, max_age: float = DATA_VERSION_TTL) -> None:
+        """Refresh only if the probed data version differs from the loaded one.
+
+        When data is already loaded and another thread is refreshing, returns at once
+        and keeps serving the current (possibly stale) data.
+        """
+        if not self.lock.acquire(blocking=self.analysis_data is None):
+            return
+        if self.stale:
+            max_age = 0
+        try:
+            # Supabase fora do ar: quem já tem dados não espera o timeout de novo até o retry_at.
+            if self.analysis_data is not None and time.monotonic() < self.retry_at:
+                return
+            try:
+                if SHARED_DIR:
+                    self._sync_shared(max_age)
+                else:
+                    self._sync_direct(max_age)
+            except Exception:
+                self._probe_failed()
+                raise
+            self.failures = 0
+            self.retry_at = 0.0
+        finally:
+            self.lock.release()
+
+    def _sync_direct(self, max_age: float) -> None:
+        if self.analysis_data is not None and time.monotonic() - self.probed_at < max_age:
+            return
+        version = probe_data_version()
+        if version != self.version or self.analysis_data is None:
+            self._refresh(version)
+        self.probed_at = time.monotonic()
+        self.stale = False
+
+    def warm_start(self) -> bool:
+        """Load the on-disk snapshot if nothing is loaded yet. Returns True if it was used.
+
+        A loaded store returns before touching the lock: refreshes hold it for the whole
+        download, and readers must keep being served meanwhile.
+        """
+        if self.analysis_data is not None:
+            return False
+        with self.lock:
+            if self.analysis_data is not None:
+                return False
+            try:
+                self._load_snapshot()
+            except FileNotFoundError:
+                return False
+            except Exception:
+                logger.exception("Snapshot em %s ignorado", SNAPSHOT_DIR)
+                return False
+        return True
+
+    def revalidate_in_background(self, max_age: float = 0) -> None:
+        """Sync against Supabase on a daemon thread; readers keep the current data meanwhile.
+
+        Periodic calls (``max_age`` > 0) do nothing while a previous one is still running;
+        forced ones (Realtime, warm start) always start, so no change notice is lost.
+        """
+        if max_age and self.revalidating:
+            return
+        self.revalidating = True
+
+        def run() -> None:
+            try:
+                self.sync(max_age=max_age)
+            except Exception:
+                logger.exception("Falha ao revalidar dados em segundo plano")
+            finally:
+                self.revalidating = False
+
+        threading.Thread(target=run, name="dataset-revalidate", daemon=True).start()
+
+    def _refresh(self, version: Tuple, scan_keys: bool = False) -> None:
+        """Bring the rows up to ``version``; ``scan_keys`` forces the key scan of every delta view."""
+        if self.analyses_table is not None:
+            self.rows[DASHBOARD_VIEW] = analyses_from_snapshot(self.analyses_table)
+            self.analyses_table = None
+        views = (DASHBOARD_VIEW, CALENDAR_VIEW)
+        counts = {view: count for view, (count, _) in zip(views, version)}
+        atuais, anteriores = dict(zip(views, version)), dict(zip(views, self.version or (None, None)))
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="supabase-fetch") as pool:
+            pages = {}
+            key_scans = {}
+            deltas = {view for view in self.PARSERS if self.watermarks[view] is not None}
+            for view, (columns, _) in self.PARSERS.items():
+                since = self.watermarks[view]
+                count = counts.get(view)
+                if since is None and count is not None:
+                    # Carga completa: páginas por intervalo, baixadas em paralelo.
+                    for start in range(0, count, PAGE_SIZE):
+                        future = submit_traced(pool, "fetch.pagina", fetch_view_range, view, columns, start, start + PAGE_SIZE - 1, view=view)
+                        pages[future] = view
+                else:
+                    pages[submit_traced(pool, "fetch.delta", collect_view_rows, view, columns, since, view=view)] = view
+
+            # O parse de cada página acontece assim que ela chega, enquanto as demais ainda baixam.
+            for future in as_completed(pages):
+                view = pages[future]
+                with span("decode", view=view):
+                    self._merge_rows(view, future.result())
+
+            # O delta só vê linhas com DATA_ATUALIZACAO >= marca d'água: remoções e linhas com data
+            # nula ou antiga só aparecem comparando chaves. A contagem não basta (uma inserção e uma
+            # remoção se anulam), então a varredura roda sempre que a versão da view mudou.
+            for view in deltas:
+                if scan_keys or anteriores[view] != atuais[view]:
+                    key_scans[view] = submit_traced(pool, "fetch.chaves", fetch_view_keys, view, view=view)
+
+            faltantes = {}
+            for view, future in key_scans.items():
+                rows = self.rows[view]
+                remotas = future.result()
+                for key in rows.keys() - remotas:
+                    del rows[key]
+                    self.errors.pop((view, key), None)
+                    self.changed[view].add(key)
+                chaves = sorted(remotas - rows.keys())
+                if chaves:
+                    faltantes[submit_traced(pool, "fetch.faltantes", fetch_view_rows_by_keys, view, self.PARSERS[view][0], chaves, view=view)] = view
+
+            for future in as_completed(faltantes):
+                view = faltantes[future]
+                with span("decode", view=view):
+                    self._merge_rows(view, future.result())
+
+        for view, (columns, _) in self.PARSERS.items():
+            count = counts.get(view)
+            if count is not None and len(self.rows[view]) < count:
+                # Páginas por offset podem pular linhas se a view mudou durante a carga.
+                self._merge_rows(view, collect_view_rows(view, columns))
+
+        self.version = version
+        self.probed_at = time.monotonic()
+        if self.analysis_data is not None and not any(self.changed.values()):
+            # Versão mudou sem alterar linhas (ex.: só a linha da marca d'água voltou no delta).
+            if SHARED_DIR:
+                write_shared_pointer({"id": self.shared_id, "probed_at": time.time()})
+            return
+        self._assemble()
+        try:
+            self._save_snapshot()
+        except Exception:
+            logger.exception("Falha ao gravar snapshot em %s", SNAPSHOT_DIR)
+        if SHARED_DIR:
+            self._publish_shared(time.time())
+
+    def _snapshot_tables(self) -> Tuple[pa.Table, pa.Table]:
+        # Linhas com RESULTADO vazio ou inválido entram com campos nulos: a contagem restaurada
+        # precisa bater com a da sonda, senão o próximo refresh baixa a view inteira de novo.
+        vazia = {"produto": None, "pais": None, "sentimento": None, "resumo": None, "links": None}
+        analises = pa.Table.from_pylist([
+            {"ID": key, **vazia} if a is None else {
+                "ID": key,
+                "produto": a.produto,
+                "pais": a.pais,
+                "sentimento": a.sentimento,
+                "resumo": a.resumo,
+                "links": json.dumps([asdict(link) for link in a.links], ensure_ascii=False),
+            }
+            for key, a in self.rows[DASHBOARD_VIEW].items()
+        ])
+        calendario = pa.Table.from_pylist([
+            {"ID": key, "produto": item.produto, "local": item.local, "meses": item.meses}
+            for key, item in self.rows[CALENDAR_VIEW].items()
+        ])
+        metadata = {
+            b"watermarks": json.dumps(self.watermarks).encode(),
+            b"version": json.dumps(self.version).encode(),
+            b"erros": json.dumps(list(self.errors.values()), ensure_ascii=False, default=str).encode(),
+        }
+        return analises.replace_schema_metadata(metadata), calendario.replace_schema_metadata(metadata)
+
+    def _save_snapshot(self) -> None:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        for nome, tabela in zip(("analises", "calendario"), self._snapshot_tables()):
+            path = os.path.join(SNAPSHOT_DIR, f"{nome}.parquet")
+            pq.write_table(tabela, f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+
+    def _load_snapshot(self) -> None:
+        self._restore_tables(
+            pq.read_table(os.path.join(SNAPSHOT_DIR, "analises.parquet")),
+            pq.read_table(os.path.join(SNAPSHOT_DIR, "calendario.parquet")),
+        )
+
+    def _restore_tables(self, analises: pa.Table, calendario: pa.Table) -> None:
+        metadata = calendario.schema.metadata
+        if metadata != analises.schema.metadata:
+            raise ValueError("snapshots de versões diferentes")
+        self.rows[DASHBOARD_VIEW] = {}
+        self.analyses_table = analises
+        self.rows[CALENDAR_VIEW] = calendar_from_snapshot(calendario)
+        self.watermarks = json.loads(metadata[b"watermarks"])
+        self.version = tuple(tuple(v) for v in json.loads(metadata[b"version"]))
+        self.errors = {(DASHBOARD_VIEW, erro["ID"]): erro for erro in json.loads(metadata[b"erros"])}
+        # O índice de busca (a parte mais cara) só começa depois que os dados foram publicados,
+        # para não disputar o GIL com a restauração: a busca espera por ele, o resto da tela não.
+        pendente = self._assemble(full=True, defer_search=True)
+        if pendente is not None:
+            threading.Thread(target=pendente, name="search-index", daemon=True).start()
+
+    def _publish_shared(self, probed_at: float) -> None:
+        """Write the dataset as Arrow IPC files and atomically point CURRENT.json at them."""
+        dataset_id = f"{time.time_ns():x}"
+        for nome, tabela in zip(("analises", "calendario"), self._snapshot_tables()):
+            path = os.path.join(SHARED_DIR, f"{nome}-{dataset_id}.arrow")
+            with pa.OSFile(f"{path}.tmp", "wb") as sink, pa.ipc.new_file(sink, tabela.schema) as writer:
+                writer.write_table(tabela)
+            os.replace(f"{path}.tmp", path)
+        write_shared_pointer({"id": dataset_id, "probed_at": probed_at})
+        self.shared_id = dataset_id
+        # Processos que ainda mapeiam a geração anterior mantêm acesso mesmo após o unlink.
+        for nome in os.listdir(SHARED_DIR):
+            if nome.endswith(".arrow") and not nome.endswith(f"-{dataset_id}.arrow"):
+                os.remove(os.path.join(SHARED_DIR, nome))
+
+    def _adopt_shared(self, pointer: Optional[Dict[str, Any]]) -> None:
+        """Serve the dataset published by another worker, if it differs from ours.
+
+        The analyses are read from the memory-mapped file on demand (see ArrowAnalyses), so
+        the page cache holds one copy per host; the search index is built after the data is
+        served.
+        """
+        if not pointer or pointer["id"] == self.shared_id:
+            return
+        tabelas = []
+        try:
+            for nome in ("analises", "calendario"):
+                source = pa.memory_map(os.path.join(SHARED_DIR, f"{nome}-{pointer['id']}.arrow"))
+                tabelas.append(pa.ipc.open_file(source).read_all())
+        except FileNotFoundError:
+            # Geração substituída entre a leitura do ponteiro e o mapeamento: fica para o próximo sync.
+            return
+        self._restore_tables(*tabelas)
+        self.shared_id = pointer["id"]
+
+    def _sync_shared(self, max_age: float, force: bool = False) -> None:
+        """Shared-dir variant of ``sync``: adopt what another worker published, and only
+        probe/refresh Supabase while holding the cross-process refresh lock."""
+        pointer = read_shared_pointer()
+        self._adopt_shared(pointer)
+        if not force and self.analysis_data is not None and pointer and time.time() - pointer["probed_at"] < max_age:
+            return
+        with shared_refresh_lock(blocking=force or self.analysis_data is None) as leader:
+            if not leader:
+                return
+            pointer = read_shared_pointer()
+            self._adopt_shared(pointer)
+            if not force and self.analysis_data is not None and pointer and time.time() - pointer["probed_at"] < max_age:
+                return
+            version = probe_data_version()
+            if force or version != self.version or self.analysis_data is None:
+                self._refresh(version, scan_keys=force)
+            else:
+                write_shared_pointer({"id": self.shared_id, "probed_at": time.time()})
+            self.probed_at = time.monotonic()
+            self.stale = False
+
+    def _merge_rows(self, view: str, page: List[Dict[str, Any]]) -> None:
+        parse = self.PARSERS[view][1]
+        rows = self.rows[view]
+        watermark = self.watermarks[view]
+        changed = self.changed[view]
+        parsed, errors = parse(page)
+        for i, (row, item) in enumerate(zip(page, parsed)):
+            key = row[VIEW_KEY_COLUMN]
+            if key not in rows or rows[key] != item:
+                rows[key] = item
+                changed.add(key)
+            if i in errors:
+                self.errors[(view, key)] = {"ID": key, "PRODUTO": row.get("PRODUTO", "desconhecido"), "erro": errors[i]}
+            else:
+                self.errors.pop((view, key), None)
+            updated = row.get(VIEW_UPDATED_COLUMN)
+            if updated and (watermark is None or updated > watermark):
+                watermark = updated
+        self.watermarks[view] = watermark
+
+    @traced("assemble")
+    def _assemble(self, full: bool = False, defer_search: bool = False) -> Optional[Callable[[], None]]:
+        """Publish new derived structures, rebuilding only the parts whose rows changed.
+
+        New dicts are built on every call: sessions still reading the previous ones are not
+        affected. ``full=True`` ignores the previous structures (after restoring rows wholesale).
+        ``indice_busca`` is a Future; with ``defer_search`` a full index is left pending and
+        the callable that builds it is returned, for the caller to run off the render path.
+        """
+        changed, self.changed = self.changed, {view: set() for view in self.PARSERS}
+        old_calendar, old_analysis = (None, None) if full else self.datasets
+        agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        pendente = None
+
+        if old_analysis is None or changed[DASHBOARD_VIEW]:
+            if self.analyses_table is not None:
+                keys, analises, tabela = arrow_analysis_parts(self.analyses_table)
+            else:
+                itens = [(key, a) for key, a in sorted(self.rows[DASHBOARD_VIEW].items()) if a is not None]
+                keys = [key for key, _ in itens]
+                analises = [a for _, a in itens]
+                tabela = build_analysis_table(analises)
+            if old_analysis is not None:
+                indice = resolved(old_analysis["indice_busca"].result().updated(keys, analises, changed[DASHBOARD_VIEW]))
+            elif defer_search:
+                indice = Future()
+                pendente = functools.partial(fill_future, indice, lambda: SearchIndex(keys, analises))
+            else:
+                indice = resolved(SearchIndex(keys, analises))
+            partes = {
+                "analises": analises,
+                "tabela": tabela,
+                "indice_busca": indice,
+            }
+        else:
+            partes = {key: old_analysis[key] for key in ("analises", "tabela", "indice_busca")}
         analysis_data = {
             "metadata": {
-                "data_geracao": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "data_geracao": agora,
                 "cenario_climatico": "Cenário climático atualizado via Supabase",
                 "ano_alvo": TARGET_YEAR
             },
-            "analises": []
+            **partes,
+            "erros": [erro for _, erro in sorted(self.errors.items(), key=lambda kv: str(kv[0]))]
         }
 
-        for row in dashboard_rows:
-            resultado_json = row.get("RESULTADO")
-            if resultado_json:
-                try:
-                    analise = json.loads(resultado_json) if isinstance(resultado_json, str) else resultado_json
-                    analysis_data["analises"].append(analise)
-                except json.JSONDecodeError as e:
-                    st.warning(f"Erro ao processar JSON para produto {row.get('PRODUTO', 'desconhecido')}: {e}")
-                    continue
-
+        # no_relatorio depende das análises: o calendário só é reaproveitado se esse conjunto não mudou.
+        produtos_no_relatorio = frozenset(str(nome).upper() for nome in analysis_data["tabela"]["produto"].cat.categories)
+        if old_calendar is None or changed[CALENDAR_VIEW] or old_calendar["no_relatorio"] != produtos_no_relatorio:
+            produtos = [
+                replace(item, no_relatorio=item.produto_key in produtos_no_relatorio)
+                for _, item in sorted(self.rows[CALENDAR_VIEW].items())
+            ]
+            partes = {
+                "produtos": produtos,
+                "por_mes": build_month_index(produtos),
+                # Índice (PRODUTO, LOCAL) normalizado para checar duplicados sem ir ao banco.
+                "chaves": {normalize_product(item.produto, item.local) for item in produtos},
+            }
+        else:
+            partes = {key: old_calendar[key] for key in ("produtos", "por_mes", "chaves")}
         calendar_data = {
             "metadata": {
-                "gerado_em": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "gerado_em": agora,
                 "ano": TARGET_YEAR
             },
-            "produtos": []
+            **partes,
+            "no_relatorio": produtos_no_relatorio,
         }
+        analysis_data["view_model"] = build_view_model(calendar_data, analysis_data)
+        self.datasets = (calendar_data, analysis_data)
+        return pendente
 
-        mapa_meses = {
-            "JAN": 1, "FEV": 2, "MAR": 3, "ABR": 4, "MAI": 5, "JUN": 6,
-            "JUL": 7, "AGO": 8, "SET": 9, "OUT": 10, "NOV": 11, "DEZ": 12
-        }
+@st.cache_resource
+def get_dataset_store() -> DatasetStore:
+    """Process-wide dataset store shared by every session."""
+    return DatasetStore()
+
+# -----------------------------------------------------------------------------
+# Invalidação por push (Supabase Realtime)
+# -----------------------------------------------------------------------------
+REALTIME_ENABLED = os.environ.get("DASHBOARD_REALTIME", "0") == "1"
+# "*" (padrão) escuta todas as tabelas do schema public na publicação supabase_realtime: cobre as
+# tabelas por trás de vw_dashboard_products e vw_monitored_products sem precisar nomeá-las aqui.
+REALTIME_TABLES = [t.strip() for t in os.environ.get("DASHBOARD_REALTIME_TABLES", "*").split(",") if t.strip()]
+# Janela (segundos) que agrupa a rajada de eventos de uma escrita da pipeline numa única revalidação.
+REALTIME_DEBOUNCE = float(os.environ.get("DASHBOARD_REALTIME_DEBOUNCE", "2"))
+
+class RealtimeSubscriber:
+    """Listens to Postgres changes on REALTIME_TABLES and revalidates the store on push.
+
+    Runs its own asyncio loop on a daemon thread. Each change drops the cached queries
+    tagged with its table and marks the store stale; a burst of changes is coalesced into
+    one background revalidation after REALTIME_DEBOUNCE seconds. The tables must be in the
+    ``supabase_realtime`` publication and readable by the anon key; ``"*"`` subscribes to
+    every such table of the public schema.
+    """
+
+    def __init__(self, store: DatasetStore, queries: QueryCache, tables: List[str]) -> None:
+        self.store = store
+        self.queries = queries
+        self.tables = tables
+        self.loop = asyncio.new_event_loop()
+        self.pending: Optional[asyncio.TimerHandle] = None
+        self.client: Any = None
+        self.thread = threading.Thread(target=self._run, name="realtime-subscriber", daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        """Close the websocket and stop the subscriber's loop."""
+        if self.client is not None:
+            asyncio.run_coroutine_threadsafe(self.client.close(), self.loop).result(timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._subscribe())
+        except Exception:
+            logger.exception("Falha ao assinar o Supabase Realtime; seguindo só com sondagem")
+            return
+        self.loop.run_forever()
+
+    async def _subscribe(self) -> None:
+        from realtime import AsyncRealtimeClient
+
+        self.client = client = AsyncRealtimeClient(f"{SUPABASE_URL}/realtime/v1", SUPABASE_ANON_KEY, auto_reconnect=True)
+        await client.connect()
+        channel = client.channel("dashboard-safra")
+        for table in self.tables:
+            channel.on_postgres_changes("*", schema="public", table=None if table == "*" else table, callback=self._on_change)
+        await channel.subscribe()
+        logger.info("Realtime assinado para %s", ", ".join(self.tables))
+
+    def _on_change(self, payload: Dict[str, Any]) -> None:
+        table = (payload.get("data") or payload).get("table")
+        if table:
+            self.queries.invalidate(table)
+        self.store.mark_stale()
+        if self.pending is None:
+            self.pending = self.loop.call_later(REALTIME_DEBOUNCE, self._revalidate)
+
+    def _revalidate(self) -> None:
+        self.pending = None
+        self.store.revalidate_in_background()
+
+@st.cache_resource
+def start_realtime_subscriber() -> Optional[RealtimeSubscriber]:
+    """Start the process-wide subscriber once, when DASHBOARD_REALTIME=1."""
+    if not (REALTIME_ENABLED and REALTIME_TABLES and SUPABASE_URL and SUPABASE_ANON_KEY):
+        return None
+    subscriber = RealtimeSubscriber(get_dataset_store(), get_query_cache(), REALTIME_TABLES)
+    subscriber.start()
+    return subscriber
+
+@traced("load_data")
+def load_data(refresh: bool = False) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Load calendar and analysis data from Supabase.
+
+    A cheap version probe runs at most every DATA_VERSION_TTL seconds and the data is only
+    re-fetched when it changed; ``refresh=True`` forces an incremental delta refresh. After a
+    restart the last Parquet snapshot is served immediately and revalidated in background.
+    Once data is loaded, periodic probes also run in background: a rerun only blocks on
+    Supabase when nothing is loaded yet or after a write of this app marked the data stale.
+    """
+    if not get_reader_client():
+        st.error("Conexão com Supabase não configurada.")
+        return None, None
 
-        produtos_no_relatorio = {analise.get("produto", "").strip().upper() for analise in analysis_data["analises"]}
-
-        for row in calendar_rows:
-            produto = row.get("PRODUTO", "").strip()
-            safra = row.get("COLHEITA", "")
-            local = row.get("LOCAL", "")
-
-            meses_ativos = {mes: False for mes in MESES}
-            if safra and isinstance(safra, str):
-                partes = [p.strip().upper() for p in safra.split('-')]
-                if len(partes) == 2 and partes[0] in mapa_meses and partes[1] in mapa_meses:
-                    ini = mapa_meses[partes[0]]
-                    fim = mapa_meses[partes[1]]
-
-                    if ini <= fim:
-                        for i in range(ini, fim + 1):
-                            meses_ativos[MESES[i-1]] = True
-                    else:
-                        for i in range(ini, 13):
-                            meses_ativos[MESES[i-1]] = True
-                        for i in range(1, fim + 1):
-                            meses_ativos[MESES[i-1]] = True
-
-            calendar_data["produtos"].append({
-                "produto": produto,
-                "local": local,
-                "no_relatorio": produto.upper() in produtos_no_relatorio,
-                "meses_ativos": meses_ativos
-            })
-
-        return calendar_data, analysis_data
+    store = get_dataset_store()
+    start_realtime_subscriber()
+    try:
+        if refresh:
+            store.refresh()
+        elif store.warm_start():
+            # Snapshot servido na hora; a revalidação troca os dados quando o Supabase responder.
+            store.revalidate_in_background()
+        elif store.analysis_data is not None and not store.stale:
+            if store.probe_due():
+                store.revalidate_in_background(max_age=DATA_VERSION_TTL)
+        else:
+            store.sync()
+        return store.datasets
 
     except Exception as e:
         st.error(f"Erro ao carregar dados do Supabase: {e}")
-        return None, None
+        return store.datasets
 
 
 # -----------------------------------------------------------------------------
@@ -976,19 +2113,50 @@ RELATORIO_MES = list(MESES_LABELS.values())[datetime.now().month - 1]
 def sentiment_icon(sent):
     return ""
 
-def build_calendar_html(produtos: List[Dict[str, Any]]) -> str:
+# -----------------------------------------------------------------------------
+# Cache de fragmentos HTML por versão dos dados
+# -----------------------------------------------------------------------------
+HTML_CACHE_SIZE = int(os.environ.get("HTML_CACHE_SIZE", "32"))
+CHART_CACHE_SIZE = int(os.environ.get("CHART_CACHE_SIZE", "64"))
+
+@st.cache_resource
+def get_html_cache() -> Tuple[LRUCache, threading.Lock]:
+    """Process-wide LRU of rendered HTML fragments, keyed by (fragment, data version, options)."""
+    return LRUCache(maxsize=HTML_CACHE_SIZE), threading.Lock()
+
+@st.cache_resource
+def get_chart_cache() -> Tuple[LRUCache, threading.Lock]:
+    """Process-wide LRU of built Plotly figures, keyed by (data version, filters, options)."""
+    return LRUCache(maxsize=CHART_CACHE_SIZE), threading.Lock()
+
+def memoized(cache_and_lock: Tuple[LRUCache, threading.Lock], key: Tuple, build: Callable[[], Any]) -> Any:
+    """Return the value cached under ``key``, building it on a miss."""
+    cache, lock = cache_and_lock
+    with lock:
+        value = cache.get(key)
+    if value is None:
+        value = build()
+        with lock:
+            cache[key] = value
+    return value
+
+def cached_html(key: Tuple, build: Callable[[], str]) -> str:
+    """Return the HTML fragment cached under ``key``, building it on a miss."""
+    return memoized(get_html_cache(), key, build)
+
+
+def build_calendar_html(produtos: List[CalendarEntry], por_mes: Dict[str, Tuple[int, ...]]) -> str:
     """Generate HTML + JS for a calendar with stable hover."""
-    por_mes = {m: [] for m in MESES}
-    for item in produtos:
-        nome = item.get("produto", "").strip()
-        origem = item.get("local", "").strip()
-        meses = item.get("meses_ativos", {})
-        tracked = item.get("no_relatorio", False)
-        for mes in MESES:
-            if meses.get(mes, False):
-                por_mes[mes].append({"nome": nome, "tracked": tracked, "origem": origem})
-
-    calendar_js = json.dumps(por_mes, ensure_ascii=False)
+    calendar_js = json.dumps(
+        {
+            mes: [
+                {"nome": produtos[p].produto, "tracked": produtos[p].no_relatorio, "origem": produtos[p].local}
+                for p in posicoes
+            ]
+            for mes, posicoes in por_mes.items()
+        },
+        ensure_ascii=False,
+    )
     months_js = json.dumps(
         [{"key": m, "label": MESES_LABELS.get(m, m)} for m in MESES],
         ensure_ascii=False,
@@ -1111,52 +2279,34 @@ def build_calendar_html(produtos: List[Dict[str, Any]]) -> str:
     return html
 
 
-def render_calendar_list(produtos: List[Dict[str, Any]], analises: List[Dict[str, Any]]) -> None:
-    """Render month-by-month list in compact cards."""
-    emoji_sent = {"POSITIVO": "🟢", "NEUTRO": "⚪", "NEGATIVO": "🔴"}
-    mapa_sent = {}
-    for a in analises:
-        nome = (a.get("produto") or "").strip().upper()
-        mapa_sent[nome] = a.get("sentimento", "").upper()
-
-    por_mes = {m: [] for m in MESES}
-    for item in produtos:
-        nome = item.get("produto", "").strip()
-        local = (item.get("local", "") or "").strip() or "Origem não informada"
-        nome_key = nome.upper()
-        meses = item.get("meses_ativos", {})
-        tracked = item.get("no_relatorio", False)
-        sentimento = mapa_sent.get(nome_key)
-        emoji = emoji_sent.get(sentimento, "•") if tracked else "○"
-        for mes in MESES:
-            if meses.get(mes, False):
-                por_mes[mes].append({"nome": nome, "tracked": tracked, "emoji": emoji, "local": local})
-
-    cards_html = ""
+@traced("html.calendario")
+def build_calendar_list_html(calendario: Dict[str, Tuple[CalendarItem, ...]]) -> str:
+    """Build the month-by-month list of compact cards."""
+    cards = []
     for mes in MESES:
         mes_label = MESES_LABELS.get(mes, mes)
-        items = sorted(por_mes[mes], key=lambda x: not x["tracked"])
+        items = calendario[mes]
         if items:
             itens_html = "".join(
-                f"<div class='cal-item {'cal-tracked' if it['tracked'] else ''}' title='Origem: {html.escape(it['local'], quote=True)}'>"
-                f"{it['emoji']} {it['nome']}"
+                f"<div class='cal-item {'cal-tracked' if it.tracked else ''}' title='Origem: {html.escape(it.local, quote=True)}'>"
+                f"{it.emoji} {it.nome}"
                 f"</div>"
                 for it in items
             )
         else:
             itens_html = "<div class='cal-item cal-empty'>Sem produtos</div>"
 
-        cards_html += f"""
+        cards.append(f"""
         <div class="cal-card-list">
           <div class="cal-card-header">{mes_label}</div>
           <div class="cal-card-body">
             {itens_html}
           </div>
         </div>
-        """
+        """)
+    cards_html = "".join(cards)
 
-    st.markdown(
-        f"""
+    return f"""
         <style>
           .cal-grid {{
             display: grid;
@@ -1233,7 +2383,14 @@ def render_calendar_list(produtos: List[Dict[str, Any]], analises: List[Dict[str
         <div class="cal-grid">
           {cards_html}
         </div>
-        """,
+        """
+
+
+@traced("render_calendar_list")
+def render_calendar_list(vm: DashboardViewModel) -> None:
+    """Render month-by-month list in compact cards."""
+    st.markdown(
+        cached_html(("calendario", vm.versao), lambda: build_calendar_list_html(vm.calendario)),
         unsafe_allow_html=True,
     )
 
@@ -1247,16 +2404,22 @@ def enforce_plotly_theme(fig):
     )
 
 
-def render_metrics(calendar_data: Dict, analyses: List[Dict]) -> None:
-    total_produtos = len(calendar_data["produtos"])
-    produtos_tracked = sum(1 for p in calendar_data["produtos"] if p.get("no_relatorio", False))
-    total_analises = len(analyses)
-    pos = sum(1 for a in analyses if a.get("sentimento") == "POSITIVO")
-    neg = sum(1 for a in analyses if a.get("sentimento") == "NEGATIVO")
-    neu = sum(1 for a in analyses if a.get("sentimento") == "NEUTRO")
+@traced("render_metrics")
+def render_metrics(vm: DashboardViewModel) -> None:
+    st.markdown(cached_html(("metricas", vm.versao), lambda: build_metrics_html(vm)), unsafe_allow_html=True)
 
-    st.markdown(
-        """
+
+@traced("html.metricas")
+def build_metrics_html(vm: DashboardViewModel) -> str:
+    """Build the metric cards (with their styles) of a dataset."""
+    total_produtos = vm.total_produtos
+    produtos_tracked = vm.produtos_rastreados
+    total_analises = vm.total_analises
+    pos = vm.sentimentos["POSITIVO"]
+    neg = vm.sentimentos["NEGATIVO"]
+    neu = vm.sentimentos["NEUTRO"]
+
+    return """
         <style>
           .metric-grid {
             display: grid;
@@ -1332,12 +2495,7 @@ def render_metrics(calendar_data: Dict, analyses: List[Dict]) -> None:
             font-weight: 500;
           }
         </style>
-        """,
-        unsafe_allow_html=True,
-    )
-
-    st.markdown(
-        f"""
+        """ + f"""
         <div class="metric-grid">
           <div class="metric-block">
             <p class="metric-title">Total de Produtos</p>
@@ -1365,161 +2523,356 @@ def render_metrics(calendar_data: Dict, analyses: List[Dict]) -> None:
             </div>
           </div>
         </div>
-        """,
-        unsafe_allow_html=True,
-    )
+        """
 
 
-def render_filters_in_column(col: Any, analysis_data: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+@traced("render_filters")
+def render_filters_in_column(col: Any, analysis_data: Dict[str, Any]) -> Tuple[str, List[str], List[str]]:
     col.markdown("### Filtros")
-    sentimentos = ["POSITIVO", "NEUTRO", "NEGATIVO"]
-    paises = sorted({a.get("pais", "") for a in analysis_data["analises"] if a.get("pais")})
+    busca = col.text_input("Buscar", placeholder="Ex: geada, Turquia, café", key="busca_analises")
+    sentimentos = SENTIMENTOS
+    paises = list(analysis_data["view_model"].paises)
     sent_sel = col.multiselect("Perspectiva", sentimentos, default=[])
     pais_sel = col.multiselect("País", paises, default=[])
     if not sent_sel:
         sent_sel = sentimentos
     if not pais_sel:
         pais_sel = paises
-    return sent_sel, pais_sel
+    return busca.strip(), sent_sel, pais_sel
+
 
+ITENS_POR_PAGINA_OPCOES = [10, 20, 50, 100]
+ITENS_POR_PAGINA = int(os.environ.get("ANALYSES_PAGE_SIZE", "20"))
 
-def render_analyses(analises: List[Dict[str, Any]]) -> None:
-    if not analises:
+
+def render_pagination(total: int, key: str) -> Tuple[int, int]:
+    """Render page-size and jump-to-page controls; returns the [start, end) slice to show."""
+    opcoes = sorted(set(ITENS_POR_PAGINA_OPCOES) | {ITENS_POR_PAGINA})
+    with st.container(horizontal=True, vertical_alignment="bottom"):
+        page_size = st.selectbox(
+            "Itens por página", opcoes, index=opcoes.index(ITENS_POR_PAGINA), key=f"{key}_page_size", width=160
+        )
+        pages = max(1, -(-total // page_size))
+        page_key = f"{key}_page"
+        # Filtros podem encolher a lista: mantém a página atual dentro do novo limite.
+        if st.session_state.get(page_key, 1) > pages:
+            st.session_state[page_key] = pages
+        page = st.number_input(f"Página (de {pages})", min_value=1, max_value=pages, step=1, key=page_key, width=160)
+    start = (int(page) - 1) * page_size
+    end = min(start + page_size, total)
+    st.caption(f"Exibindo {start + 1}–{end} de {total}")
+    return start, end
+
+
+@traced("render_analyses")
+def render_analyses(by_sent: Dict[str, Sequence]) -> None:
+    if not any(by_sent.values()):
         st.warning("Nenhuma análise corresponde aos filtros selecionados.")
         return
 
-    by_sent = defaultdict(list)
-    for a in analises:
-        sentimento = a.get("sentimento", "NEUTRO")
-        by_sent[sentimento].append(a)
-
-    icon_map = {"POSITIVO": "🟢", "NEUTRO": "⚪", "NEGATIVO": "🔴"}
-    for sent in ["POSITIVO", "NEUTRO", "NEGATIVO"]:
-        if sent not in by_sent:
+    start, end = render_pagination(sum(len(v) for v in by_sent.values()), key="analises")
+    icon_map = EMOJI_SENTIMENTO
+    offset = 0
+    for sent in SENTIMENTOS:
+        grupo = by_sent.get(sent) or []
+        # Só a fatia do grupo que cai na página atual é renderizada.
+        pagina = grupo[max(start - offset, 0):max(end - offset, 0)]
+        offset += len(grupo)
+        if not pagina:
             continue
         st.subheader(f"{icon_map.get(sent, '')} {sent}")
-        for a in by_sent[sent]:
-            label = f"{icon_map.get(a['sentimento'], '')} **{a['produto']}** ({a['pais']})"
+        for a in pagina:
+            label = f"{icon_map.get(a.sentimento, '')} **{a.produto}** ({a.pais})"
             with st.expander(label, expanded=False):
                 st.markdown("**📝 Resumo**")
-                st.markdown(a.get("resumo", ""))
-                if a.get("links"):
+                st.markdown(a.resumo)
+                if a.links:
                     st.markdown("**🔗 Fontes (até 5):**")
-                    for link in a["links"][:5]:
-                        st.markdown(f"- [{link['titulo']}]({link['url']})")
-                        st.caption(f"  Data: {link.get('data', 'N/A')}")
+                    for link in a.links[:5]:
+                        st.markdown(f"- [{link.titulo}]({link.url})")
+                        st.caption(f"  Data: {link.data or 'N/A'}")
+
+
+def count_values(col: pd.Series) -> pd.Series:
+    """value_counts of a categorical column without its unused or empty categories."""
+    counts = col.value_counts()
+    counts = counts[(counts > 0) & (counts.index != "")]
+    counts.index = counts.index.astype(str).rename(col.name)
+    return counts
+
+
+def top_n_with_others(counts: pd.Series, top_n: Optional[int]) -> pd.Series:
+    """Keep the ``top_n`` largest counts and fold the rest into a single "Outros" bar."""
+    if top_n is None or len(counts) <= top_n:
+        return counts
+    counts = counts.sort_values(ascending=False)
+    outros = pd.Series({"Outros": counts.iloc[top_n:].sum()})
+    return pd.concat([counts.iloc[:top_n], outros]).rename_axis(counts.index.name)
+
+
+@traced("plotly.estatisticas")
+def build_stats_figures(tabela: pd.DataFrame, top_n: Optional[int]) -> Tuple[Figure, Figure]:
+    """Build the sentiment pie and the per-country bar chart of the filtered analyses."""
+    sent_counts = count_values(tabela["sentimento"]).reset_index()
+    sent_counts.columns = ["sentimento", "contagem"]
+    fig = px.pie(sent_counts, values="contagem", names="sentimento", color="sentimento",
+                 color_discrete_map={"POSITIVO": "#16a34a", "NEUTRO": "#9ca3af", "NEGATIVO": "#dc2626"})
+    fig.update_traces(
+        textposition="inside",
+        textinfo="label+percent",
+        hovertemplate="%{label}: %{value}",
+        textfont=dict(size=16, color="#ffffff"),
+        texttemplate="<b>%{label}</b><br><b>%{percent}</b>"
+    )
+    enforce_plotly_theme(fig)
+    fig.update_layout(showlegend=True, margin=dict(l=0, r=0, t=0, b=0), height=320)
+
+    pais_counts = top_n_with_others(count_values(tabela["pais"]), top_n)
+    df_pais_counts = pais_counts.reset_index(name="count").rename(columns={"index": "pais"})
+    bar_fig = px.bar(df_pais_counts, x="pais", y="count", text="count")
+    bar_fig.update_traces(textposition="outside")
+    enforce_plotly_theme(bar_fig)
+    bar_fig.update_layout(height=320, margin=dict(l=0, r=0, t=0, b=0))
+    return fig, bar_fig
+
 
+# Opções do gráfico por país: quantos países exibir antes de agrupar o resto em "Outros".
+TOP_PAISES_OPCOES = {"Top 10": 10, "Top 20": 20, "Todos": None}
 
-def render_stats(analises: List[Dict[str, Any]]) -> None:
+
+@traced("render_stats")
+def render_stats(tabela: pd.DataFrame, cache_key: Tuple) -> None:
+    """Render the stats charts; figures are cached per ``cache_key`` (data version + filters)."""
+    if not len(tabela):
+        return
+    top_label = st.radio("Países no gráfico", list(TOP_PAISES_OPCOES), horizontal=True, key="stats_top_paises")
+    top_n = TOP_PAISES_OPCOES[top_label]
+    fig, bar_fig = memoized(get_chart_cache(), (*cache_key, top_n), lambda: build_stats_figures(tabela, top_n))
     c1, c2 = st.columns(2)
-    if analises:
-        with c1:
-            section_subtitle("Distribuição por Sentimento")
-            df = pd.DataFrame([a.get("sentimento", "NEUTRO") for a in analises], columns=["sentimento"])
-            sent_counts = df["sentimento"].value_counts().reset_index()
-            sent_counts.columns = ["sentimento", "contagem"]
-            fig = px.pie(sent_counts, values="contagem", names="sentimento", color="sentimento",
-                         color_discrete_map={"POSITIVO": "#16a34a", "NEUTRO": "#9ca3af", "NEGATIVO": "#dc2626"})
-            fig.update_traces(
-                textposition="inside",
-                textinfo="label+percent",
-                hovertemplate="%{label}: %{value}",
-                textfont=dict(size=16, color="#ffffff"),
-                texttemplate="<b>%{label}</b><br><b>%{percent}</b>"
-            )
-            enforce_plotly_theme(fig)
-            fig.update_layout(showlegend=True, margin=dict(l=0, r=0, t=0, b=0), height=320)
-            st.plotly_chart(fig, use_container_width=True)
-        with c2:
-            section_subtitle("Distribuição por País")
-            df = pd.DataFrame([a.get("pais", "") for a in analises if a.get("pais")], columns=["pais"])
-            df_pais_counts = df["pais"].value_counts().reset_index(name="count").rename(columns={"index": "pais"})
-            bar_fig = px.bar(df_pais_counts, x="pais", y="count", text="count")
-            bar_fig.update_traces(textposition="outside")
-            enforce_plotly_theme(bar_fig)
-            bar_fig.update_layout(height=320, margin=dict(l=0, r=0, t=0, b=0))
-            st.plotly_chart(bar_fig, use_container_width=True)
+    with c1:
+        section_subtitle("Distribuição por Sentimento")
+        st.plotly_chart(fig, use_container_width=True)
+    with c2:
+        section_subtitle("Distribuição por País")
+        st.plotly_chart(bar_fig, use_container_width=True)
 
 
+@traced("render_alerts_view")
 def render_alerts_view(cal: Dict[str, Any], ana: Dict[str, Any]) -> None:
     """Screen 1: alert products reminder (NEGATIVE sentiment)."""
     section_title("Produtos em Alerta")
     st.caption("Lista de produtos com perspectiva NEGATIVA. Utilize o resumo para identificar rapidamente o cenário e validar as informações nas notícias.")
-    alertas = [a for a in ana["analises"] if a.get("sentimento") == "NEGATIVO"]
+    alertas = ana["view_model"].alertas
     if not alertas:
         st.info("Nenhum produto em alerta no momento.")
         return
-    alertas = sorted(alertas, key=lambda x: x.get("produto", ""))
-    for a in alertas:
-        with st.expander(f"🔴 {a.get('produto', '')} ({a.get('pais', '')})"):
+    start, end = render_pagination(len(alertas), key="alertas")
+    for a in alertas[start:end]:
+        with st.expander(f"🔴 {a.produto} ({a.pais})"):
             st.markdown("**Resumo**")
-            st.markdown(a.get("resumo", ""))
-            if a.get("links"):
+            st.markdown(a.resumo)
+            if a.links:
                 st.markdown("**Fontes (até 5):**")
-                for link in a["links"][:5]:
-                    st.markdown(f"- [{link['titulo']}]({link['url']})")
-                    st.caption(f"  Data: {link.get('data', 'N/A')}")
+                for link in a.links[:5]:
+                    st.markdown(f"- [{link.titulo}]({link.url})")
+                    st.caption(f"  Data: {link.data or 'N/A'}")
 
 
+def render_load_report(ana: Dict[str, Any]) -> None:
+    """Summarise the RESULTADO rows rejected by validation in load_data."""
+    erros = ana.get("erros") or []
+    if not erros:
+        return
+    with st.expander(f"⚠️ {len(erros)} análise(s) ignorada(s) por RESULTADO inválido", expanded=False):
+        st.dataframe(pd.DataFrame(erros), use_container_width=True, hide_index=True)
+
+
+@traced("render_home")
 def render_home(cal: Dict[str, Any], ana: Dict[str, Any]) -> None:
     """Screen 2: main (metrics, calendar, charts)."""
     section_subtitle("Métricas Principais")
     st.caption("Aqui você vê, as métricas do relatório atual. Quantidade de produtos cadastrados, quantidade de produtos em safra, quantidade de produtos encontrados.")
-    render_metrics(cal, ana["analises"])
+    render_metrics(ana["view_model"])
 
     st.markdown("---")
     section_subtitle("Calendário de Safra")
     st.caption("Aqui você vê, mês a mês, o calendário de safras, referente aos períodos de colheita de cada produto. Os produtos presentes no relatório deste mês estão destacados em amarelo, e a bolinha indica o status da safra.")
-    render_calendar_list(cal["produtos"], ana["analises"])
+    render_calendar_list(ana["view_model"])
 
 
+@traced("render_analysis_view")
 def render_analysis_view(cal: Dict[str, Any], ana: Dict[str, Any]) -> None:
     """Screen 3: detailed analyses."""
     section_title("Análises")
     col_list, col_filters = st.columns([3, 1])
-    sent_filter, pais_filter = render_filters_in_column(col_filters, ana)
-    analises_filtradas = [
-        a for a in ana["analises"]
-        if a.get("sentimento", "") in sent_filter and a.get("pais", "") in pais_filter
-    ]
+    busca, sent_filter, pais_filter = render_filters_in_column(col_filters, ana)
+    tabela = ana["tabela"]
+    vm = ana["view_model"]
+    pais_mask = tabela["pais"].isin(pais_filter).to_numpy()
+    rank = None
+    if busca:
+        indice = ana["indice_busca"]
+        if not indice.done():
+            with st.spinner("Preparando o índice de busca..."):
+                indice.result()
+        hits = indice.result().search(busca)
+        rank = np.full(len(tabela), len(hits))
+        rank[hits] = np.arange(len(hits))
+        pais_mask &= rank < len(hits)
+    mask = tabela["sentimento"].isin(sent_filter).to_numpy() & pais_mask
+    by_sent = {}
+    for sent in sent_filter:
+        posicoes = vm.por_sentimento[sent][pais_mask[vm.por_sentimento[sent]]]
+        if rank is not None:
+            posicoes = posicoes[np.argsort(rank[posicoes], kind="stable")]
+        by_sent[sent] = select_analyses(ana["analises"], posicoes)
     with col_list:
-        render_analyses(analises_filtradas)
+        render_analyses(by_sent)
     st.markdown("---")
     section_subtitle("Estatísticas Adicionais")
-    render_stats(analises_filtradas)
+    render_stats(tabela[mask], (vm.versao, busca, tuple(sorted(sent_filter)), tuple(sorted(pais_filter))))
+
+
+# -----------------------------------------------------------------------------
+# Contabilidade de memória (painel de depuração)
+# -----------------------------------------------------------------------------
+# Maiores chaves listadas por sessão e entradas por cache no detalhamento.
+MEMORY_TOP_N = 10
+
+def deep_size(obj: Any) -> int:
+    """Deep size in bytes; DataFrames are measured by pandas, which sees their buffers."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    return asizeof.asizeof(obj)
+
+def megabytes(n: int) -> float:
+    return round(n / 2**20, 2)
+
+def sized_items(items: Any, label: Callable[[Any], str] = str) -> List[Dict[str, Any]]:
+    """``[{"item", "bytes"}]`` for each (key, value) pair, largest first."""
+    linhas = [{"item": label(key), "bytes": deep_size(value)} for key, value in items]
+    return sorted(linhas, key=lambda linha: linha["bytes"], reverse=True)
+
+def active_session_states() -> Dict[str, Dict[str, Any]]:
+    """User keys of every connected session's state, or only this session's.
+
+    The list of sessions comes from Streamlit's runtime internals; if they change shape,
+    only the current session is reported.
+    """
+    try:
+        from streamlit.runtime import Runtime
+
+        sessions = Runtime.instance()._session_mgr.list_active_sessions()
+        return {info.session.id: dict(info.session.session_state.filtered_state) for info in sessions}
+    except Exception:
+        return {"atual": {key: st.session_state[key] for key in st.session_state}}
 
+def session_ref(session_id: str) -> str:
+    """Short, non-reversible reference to a session: the raw ID would let anyone reading
+    the report (or its export) address that session."""
+    return hashlib.sha256(session_id.encode()).hexdigest()[:12]
+
+def memory_report() -> Dict[str, Any]:
+    """Sample deep sizes of the process-wide caches and of every session's state.
+
+    Caches shared between sessions (and objects referenced from several places) are
+    counted once per place they appear, so the totals are an upper bound.
+    """
+    store = get_dataset_store()
+    calendar_data, analysis_data = store.datasets
+    html_cache, html_lock = get_html_cache()
+    chart_cache, chart_lock = get_chart_cache()
+    queries = get_query_cache()
+    with html_lock:
+        html_entries = list(html_cache.items())
+    with chart_lock:
+        chart_entries = list(chart_cache.items())
+    with queries.lock:
+        query_entries = [(key, value) for key, (_, value, _) in queries.entries.items()]
+
+    caches = {
+        "dataset.analysis_data": sized_items((analysis_data or {}).items()),
+        "dataset.calendar_data": sized_items((calendar_data or {}).items()),
+        "dataset.rows": sized_items(store.rows.items()),
+        "html": sized_items(html_entries, label=lambda key: repr(key)[:80]),
+        "graficos": sized_items(chart_entries, label=lambda key: repr(key)[:80]),
+        "consultas": sized_items(query_entries, label=lambda key: repr(key)[:80]),
+    }
+    sessoes = {}
+    for session_id, state in active_session_states().items():
+        linhas = sized_items((key, value) for key, value in state.items() if key != "memory_report")
+        sessoes[session_ref(session_id)] = {"total": sum(l["bytes"] for l in linhas), "n_chaves": len(linhas), "chaves": linhas[:MEMORY_TOP_N]}
+    return {
+        "amostrado_em": datetime.now().isoformat(timespec="seconds"),
+        "versao_dados": repr(store.version),
+        "caches": {nome: {"total": sum(l["bytes"] for l in linhas), "entradas": linhas} for nome, linhas in caches.items()},
+        "sessoes": sessoes,
+    }
+
+def render_memory_panel() -> None:
+    """On-demand memory sample of caches and sessions, shown next to the performance panel.
+
+    The sample covers every connected session, so ``?perf=1`` alone is not enough: the panel
+    needs DASHBOARD_PERF=1 on the server or an authenticated user.
+    """
+    if PERF_TRACE.get() is None or not (PERF_ENABLED or ensure_session()):
+        return
+    with st.expander("Memória (caches e sessões)", expanded=False):
+        if st.button("Medir memória", key="memory_sample"):
+            with st.spinner("Medindo tamanhos (pode levar alguns segundos)..."):
+                st.session_state.memory_report = memory_report()
+            perf_logger.info(json.dumps({
+                "evento": "memoria",
+                "caches": {nome: c["total"] for nome, c in st.session_state.memory_report["caches"].items()},
+                "sessoes": {sid: s["total"] for sid, s in st.session_state.memory_report["sessoes"].items()},
+            }))
+        relatorio = st.session_state.get("memory_report")
+        if not relatorio:
+            st.caption("Nenhuma amostra ainda.")
+            return
+        st.caption(f"Amostra de {relatorio['amostrado_em']} • objetos compartilhados são contados em cada lugar onde aparecem.")
+        st.dataframe(
+            pd.DataFrame(
+                [{"cache": nome, "entradas": len(c["entradas"]), "MB": megabytes(c["total"])} for nome, c in relatorio["caches"].items()]
+                + [{"cache": f"sessão {sid}", "entradas": s["n_chaves"], "MB": megabytes(s["total"])} for sid, s in relatorio["sessoes"].items()]
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
+        for nome in ("dataset.analysis_data", "dataset.calendar_data"):
+            st.markdown(f"**{nome}**")
+            st.dataframe(
+                pd.DataFrame([{"item": l["item"], "MB": megabytes(l["bytes"])} for l in relatorio["caches"][nome]["entradas"][:MEMORY_TOP_N]]),
+                use_container_width=True,
+                hide_index=True,
+            )
+        st.download_button(
+            "Exportar JSON",
+            data=json.dumps(relatorio, ensure_ascii=False, indent=2),
+            file_name=f"memoria_{relatorio['amostrado_em']}.json",
+            mime="application/json",
+            key="memory_export",
+        )
 
 def main() -> None:
     """Main entry point for Streamlit dashboard."""
+    start_perf_trace()
+    # Só <style>: o st.html manda para o container de eventos, sem ocupar espaço na página.
+    st.html(THEME_STYLESHEET)
     cal, ana = load_data()
     if not cal or not ana:
         st.stop()
 
-    st.markdown(CSS, unsafe_allow_html=True)
-    
     st.title("Dashboard - Plano Safra")
     st.markdown(f"Relatório referente ao mês de {RELATORIO_MES}")
+    render_load_report(ana)
+    render_pipeline_status()
 
     if "screen" not in st.session_state:
         st.session_state.screen = "inicio"
 
     nav_container = st.container()
     with nav_container:
-        st.markdown("""
-        <style>
-        /* Força altura uniforme e texto em uma linha para todos os botões de navegação */
-        div[data-testid="column"] button[kind="secondary"],
-        button[kind="secondary"] {
-            height: 50px !important;
-            min-height: 50px !important;
-            max-height: 50px !important;
-            white-space: nowrap !important;
-            overflow: hidden !important;
-            text-overflow: ellipsis !important;
-        }
-        </style>
-        """, unsafe_allow_html=True)
-        
         col_nav = st.columns([1, 1, 1, 1.3, 1.3, 1, 1])
         if col_nav[1].button("Tela Inicial", key="nav_inicio", use_container_width=True, type="secondary", help="Produtos em alerta"):
             st.session_state.screen = "inicio"
@@ -1530,7 +2883,7 @@ def main() -> None:
         if col_nav[4].button("Adicionar Produto", key="nav_insert", use_container_width=True, type="secondary", help="Inserir novo produto"):
             st.session_state.screen = "insert"
         if col_nav[5].button("Recarregar Dados", key="nav_reload", use_container_width=True, type="secondary", help="Recarrega os dados do dashboard"):
-            st.cache_data.clear()
+            load_data(refresh=True)
             st.rerun()
             
     st.markdown("---")
@@ -1547,6 +2900,8 @@ def main() -> None:
 
     st.markdown("---")
     st.caption(f"Dashboard gerado em {ana['metadata']['data_geracao']} • Ano alvo: {ana['metadata']['ano_alvo']}")
+    render_perf_panel()
+    render_memory_panel()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+"""RealtimeSubscriber contra um servidor websocket local que fala o protocolo Phoenix do Supabase.
+
+O servidor responde ao phx_join com os bindings de postgres_changes e empurra eventos de mudança;
+o Supabase REST é o FakeSupabase do benchmark. Nada sai da máquina.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+import pytest
+from websockets.asyncio.server import serve
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import bench_dashboard as bench  # noqa: E402
+
+rd = bench.rd
+
+
+class FakeRealtimeServer:
+    """Minimal Phoenix endpoint: acks joins and heartbeats, and pushes postgres_changes on demand."""
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.joined = threading.Event()
+        self.bindings: List[Dict[str, Any]] = []
+        self.connection: Any = None
+        self.topic = ""
+        self.port = 0
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(self._serve(), self.loop).result(5)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._close(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def _serve(self) -> Any:
+        return await serve(self._handle, "127.0.0.1", 0, close_timeout=0.1)
+
+    async def _close(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, connection: Any) -> None:
+        self.connection = connection
+        async for raw in connection:
+            message = json.loads(raw)
+            if message["event"] == "phx_join":
+                self.topic = message["topic"]
+                self.bindings = [
+                    {"id": i + 1, **binding}
+                    for i, binding in enumerate(message["payload"]["config"]["postgres_changes"])
+                ]
+                await self._reply(message, {"postgres_changes": self.bindings})
+                self.joined.set()
+            elif message["event"] == "heartbeat":
+                await self._reply(message, {})
+
+    async def _reply(self, message: Dict[str, Any], response: Dict[str, Any]) -> None:
+        await self.connection.send(json.dumps({
+            "event": "phx_reply",
+            "topic": message["topic"],
+            "ref": message["ref"],
+            "payload": {"status": "ok", "response": response},
+        }))
+
+    def push_change(self, table: str, record: Dict[str, Any]) -> None:
+        """Send an INSERT on ``table`` to every binding of the joined channel."""
+        message = {
+            "event": "postgres_changes",
+            "topic": self.topic,
+            "ref": None,
+            "payload": {
+                "ids": [binding["id"] for binding in self.bindings],
+                "data": {
+                    "schema": "public",
+                    "table": table,
+                    "commit_timestamp": "2025-06-01T00:00:00Z",
+                    "type": "INSERT",
+                    "errors": None,
+                    "columns": [],
+                    "record": record,
+                },
+            },
+        }
+        asyncio.run_coroutine_threadsafe(self.connection.send(json.dumps(message)), self.loop).result(5)
+
+
+def wait_for(condition: Any, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+@pytest.fixture
+def realtime_server(monkeypatch: pytest.MonkeyPatch) -> Any:
+    server = FakeRealtimeServer()
+    server.start()
+    monkeypatch.setattr(rd, "SUPABASE_URL", f"http://127.0.0.1:{server.port}")
+    monkeypatch.setattr(rd, "SUPABASE_ANON_KEY", "anon")
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def loaded_store(monkeypatch: pytest.MonkeyPatch) -> Any:
+    backend = bench.FakeSupabase(bench.synthetic_rows(200, seed=7))
+    monkeypatch.setattr(rd, "get_reader_client", lambda: backend)
+    monkeypatch.setattr(rd, "SNAPSHOT_DIR", tempfile.mkdtemp(prefix="test_realtime_"))
+    store = rd.DatasetStore()
+    store.sync()
+    return store, backend
+
+
+def test_burst_of_changes_invalidates_and_revalidates_once(realtime_server, loaded_store, monkeypatch):
+    store, backend = loaded_store
+    monkeypatch.setattr(rd, "REALTIME_DEBOUNCE", 0.3)
+    queries = rd.QueryCache()
+    queries.get(("product_exists", "SOJA", "Brasil"), lambda: [], ("monitored_products",))
+    queries.get(("outra",), lambda: [], ("outra_tabela",))
+
+    revalidacoes = []
+    revalidate = store.revalidate_in_background
+    monkeypatch.setattr(store, "revalidate_in_background", lambda: revalidacoes.append(time.monotonic()) or revalidate())
+
+    subscriber = rd.RealtimeSubscriber(store, queries, ["*"])
+    subscriber.start()
+    try:
+        assert realtime_server.joined.wait(5)
+        # "*" assina o schema inteiro: o binding vai sem tabela.
+        assert realtime_server.bindings == [{"id": 1, "event": "*", "schema": "public"}]
+
+        novo = {"ID": 10_000, "PRODUTO": "PRODUTO NOVO", "LOCAL": "Brasil", "COLHEITA": "JAN-MAR", "DATA_ATUALIZACAO": "2030-01-01T00:00:00"}
+        backend.tables[rd.CALENDAR_VIEW].append(novo)
+        backend.keys[rd.CALENDAR_VIEW].append(novo["ID"])
+        for _ in range(3):
+            realtime_server.push_change("monitored_products", {"PRODUTO": "PRODUTO NOVO", "LOCAL": "Brasil"})
+
+        assert wait_for(lambda: store.stale)
+        assert wait_for(lambda: ("product_exists", "SOJA", "Brasil") not in queries.entries)
+        assert ("outra",) in queries.entries
+        assert revalidacoes == []
+
+        # A rajada vira uma única revalidação depois do debounce, que traz a linha nova.
+        assert wait_for(lambda: 10_000 in store.rows[rd.CALENDAR_VIEW])
+        time.sleep(0.5)
+        assert len(revalidacoes) == 1
+        assert not store.stale
+        assert store.has_product("PRODUTO NOVO", "Brasil")
+    finally:
+        subscriber.stop()